@@ -0,0 +1,71 @@
+"""Benchmark of checkpoint write latency per task for each checkpointer backend.
+
+Runs an entrypoint fanning out N tasks that each return a section-sized
+payload, once without a checkpointer and once per backend, and reports the
+added wall time per task along with the size of the SQLite database.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_checkpointer --tasks 200 --payload-kb 8
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+
+import benchmarks.stubs  # noqa: F401  (sets the environment the modules expect)
+
+from langgraph.func import entrypoint, task
+
+from src.report_writer.checkpointer import SqliteCheckpointer, make_checkpointer
+
+
+@task
+async def produce(index: int, payload_kb: int) -> dict:
+    return {"index": index, "content": "lorem ipsum " * (payload_kb * 1024 // 12)}
+
+
+def make_workflow(checkpointer):
+    @entrypoint(checkpointer=checkpointer)
+    async def workflow(inputs: dict) -> int:
+        results = await asyncio.gather(
+            *(produce(i, inputs["payload_kb"]) for i in range(inputs["tasks"]))
+        )
+        return len(results)
+
+    return workflow
+
+
+async def time_workflow(checkpointer, n_tasks, payload_kb) -> float:
+    workflow = make_workflow(checkpointer)
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    start = time.perf_counter()
+    await workflow.ainvoke({"tasks": n_tasks, "payload_kb": payload_kb}, config)
+    return time.perf_counter() - start
+
+
+async def main(n_tasks, payload_kb):
+    baseline = await time_workflow(None, n_tasks, payload_kb)
+    print(f"{n_tasks} tasks, {payload_kb} KB payload each")
+    print(f"no checkpointer: {baseline * 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "checkpoints.sqlite")
+        async with SqliteCheckpointer(path) as sqlite:
+            backends = {"memory": make_checkpointer("memory"), "sqlite": sqlite}
+            for name, checkpointer in backends.items():
+                elapsed = await time_workflow(checkpointer, n_tasks, payload_kb)
+                per_task = (elapsed - baseline) / n_tasks * 1000
+                print(f"{name:15}: {elapsed * 1000:8.1f} ms, {per_task:6.3f} ms/task write latency")
+        print(f"sqlite database: {os.path.getsize(path) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--payload-kb", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.payload_kb))
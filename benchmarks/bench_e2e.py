@@ -0,0 +1,350 @@
+"""End-to-end performance benchmark of the report writer against a baseline.
+
+Drives `report_writer_workflow` from topic to final report with recorded
+model and search responses replayed with their recorded latencies (or, with
+no cassette, the stub model and a local search corpus), then reports:
+
+- wall time, and the critical path: the longest chain of tasks that ran one
+  after the other, so `wall - critical path` is orchestration overhead
+- peak traced memory (measured in an extra run under tracemalloc)
+- model calls, search calls and prompt tokens, in total and per stage,
+  with the share of reported prompt tokens read from provider prompt caches
+- the share of section grades escalated to the section grader model, and
+  the grading latency the cascade saved
+
+Results are compared with the stored baseline of the scenario and the run
+fails when a metric regresses by more than its threshold in
+`e2e_thresholds.json`.
+
+Run from the repository root:
+
+    # Record a cassette against the real APIs (needs API keys)
+    python -m benchmarks.bench_e2e --record benchmarks/cassettes/solar --topic "Solar power"
+    # Replay it, comparing with the baseline, or storing a new one
+    python -m benchmarks.bench_e2e --cassette benchmarks/cassettes/solar
+    python -m benchmarks.bench_e2e --cassette benchmarks/cassettes/solar --update-baseline
+    # Synthetic scenario with stub models, no cassette needed
+    python -m benchmarks.bench_e2e
+"""
+
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import statistics
+import tracemalloc
+from pathlib import Path
+from unittest import mock
+
+from benchmarks.stubs import make_stub_init_chat_model, make_stub_search_provider
+from benchmarks.replay import (
+    Cassette,
+    RecordingSearchProvider,
+    make_recording_init_chat_model,
+    make_replay_init_chat_model,
+    make_replay_search_provider,
+)
+
+from src.report_writer import llm
+from src.report_writer.checkpointer import close_checkpointer
+from src.report_writer.configuration import Configuration
+from src.report_writer.search import get_search_provider, register_search_provider
+from src.report_writer.telemetry import collect, configure_logging, logger
+from src.report_writer.workflow import checkpointer, report_writer_workflow
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+THRESHOLDS_PATH = BENCHMARKS_DIR / "e2e_thresholds.json"
+BASELINES_DIR = BENCHMARKS_DIR / "baselines"
+
+# Spans of the workflow tasks; stages are reported per task
+TASK_SPANS = (
+    "generate_planner_context",
+    "generate_report_plan",
+    "grade_report_plan",
+    "generate_section_queries",
+    "search_web",
+    "write_section",
+    "build_report_digest",
+    "write_final_sections",
+)
+
+
+class SpanCollector(logging.Handler):
+    """Keeps the span records the workflow logs at INFO level."""
+
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self.spans = []
+
+    def emit(self, record: logging.LogRecord):
+        if getattr(record, "span", None) in TASK_SPANS:
+            duration = record.duration_ms / 1000
+            self.spans.append(
+                {
+                    "name": record.span,
+                    "start": record.created - duration,
+                    "end": record.created,
+                    "duration": duration,
+                    "counters": {
+                        key: getattr(record, key, 0)
+                        for key in (
+                            "llm_calls",
+                            "input_tokens",
+                            "input_tokens_estimated",
+                            "cached_input_tokens",
+                            "search_calls",
+                            "grades",
+                            "grade_escalations",
+                            "grade_latency_saved_ms",
+                        )
+                    },
+                }
+            )
+
+
+def critical_path(spans: list[dict], tolerance: float = 1e-3) -> float:
+    """Longest total duration of a chain of spans that ran one after the other."""
+    spans = sorted(spans, key=lambda span: span["start"])
+    longest = []
+    for i, span in enumerate(spans):
+        before = [
+            longest[j]
+            for j in range(i)
+            if spans[j]["end"] <= span["start"] + tolerance
+        ]
+        longest.append(span["duration"] + max(before, default=0.0))
+    return max(longest, default=0.0)
+
+
+def stage_metrics(spans: list[dict]) -> dict:
+    stages = {}
+    for span in spans:
+        stage = stages.setdefault(
+            span["name"],
+            {
+                "tasks": 0,
+                "duration_s": 0.0,
+                "llm_calls": 0,
+                "search_calls": 0,
+                "prompt_tokens": 0,
+                "reported_input_tokens": 0,
+                "cached_input_tokens": 0,
+            },
+        )
+        counters = span["counters"]
+        stage["tasks"] += 1
+        stage["duration_s"] += span["duration"]
+        stage["llm_calls"] += counters["llm_calls"]
+        stage["search_calls"] += counters["search_calls"]
+        stage["prompt_tokens"] += (
+            counters["input_tokens"] + counters["input_tokens_estimated"]
+        )
+        stage["reported_input_tokens"] += counters["input_tokens"]
+        stage["cached_input_tokens"] += counters["cached_input_tokens"]
+        if counters["grades"]:
+            stage["grades"] = stage.get("grades", 0) + counters["grades"]
+            stage["grade_escalations"] = (
+                stage.get("grade_escalations", 0) + counters["grade_escalations"]
+            )
+            stage["grade_latency_saved_ms"] = (
+                stage.get("grade_latency_saved_ms", 0)
+                + counters["grade_latency_saved_ms"]
+            )
+    for stage in stages.values():
+        reported = stage.pop("reported_input_tokens")
+        stage["cached_input_ratio"] = (
+            stage["cached_input_tokens"] / reported if reported else 0.0
+        )
+        if stage.get("grades"):
+            stage["grade_escalation_rate"] = stage["grade_escalations"] / stage["grades"]
+    return stages
+
+
+async def run_workflow(topic: str, configurable: dict) -> dict:
+    """Run one report to completion and return its metrics."""
+    config = {
+        "configurable": {
+            **configurable,
+            "plan_approval": "auto",
+            "thread_id": str(uuid.uuid4()),
+        }
+    }
+    collector = SpanCollector()
+    logger.addHandler(collector)
+    try:
+        with collect("bench_e2e") as usage:
+            start = time.perf_counter()
+            result = await report_writer_workflow.ainvoke({"topic": topic}, config)
+            wall_time = time.perf_counter() - start
+    finally:
+        logger.removeHandler(collector)
+    assert "final_report" in result, result
+
+    counters = usage.counters
+    return {
+        "wall_time_s": wall_time,
+        "critical_path_s": critical_path(collector.spans),
+        "llm_calls": counters.get("llm_calls", 0),
+        "search_calls": counters.get("search_calls", 0),
+        "prompt_tokens": counters.get("input_tokens", 0)
+        + counters.get("input_tokens_estimated", 0),
+        "output_tokens": counters.get("output_tokens", 0),
+        "cached_input_tokens": counters.get("cached_input_tokens", 0),
+        "stages": stage_metrics(collector.spans),
+    }
+
+
+async def measure(topic: str, configurable: dict, repeat: int) -> dict:
+    """Median timings over `repeat` runs, then peak memory in one traced run."""
+    runs = [await run_workflow(topic, configurable) for _ in range(repeat)]
+    metrics = dict(runs[-1])
+    for key in ("wall_time_s", "critical_path_s"):
+        metrics[key] = statistics.median(run[key] for run in runs)
+
+    tracemalloc.start()
+    try:
+        await run_workflow(topic, configurable)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    metrics["peak_memory_mb"] = peak / 2**20
+    return metrics
+
+
+def compare(metrics: dict, baseline: dict, thresholds: dict) -> list[str]:
+    """Print the metrics next to the baseline and return the regressions."""
+    rows = [
+        (key, metrics[key], baseline.get(key), thresholds[key])
+        for key in thresholds
+        if key in metrics
+    ]
+    for stage, values in metrics["stages"].items():
+        rows.append(
+            (
+                f"{stage}.prompt_tokens",
+                values["prompt_tokens"],
+                baseline.get("stages", {}).get(stage, {}).get("prompt_tokens"),
+                thresholds.get("stage_prompt_tokens"),
+            )
+        )
+
+    regressions = []
+    print(f"{'metric':45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, current, previous, threshold in rows:
+        change = ""
+        if previous:
+            ratio = current / previous - 1
+            change = f"{ratio:+.1%}"
+            if threshold is not None and ratio > threshold:
+                regressions.append(f"{key}: {previous:.4g} -> {current:.4g} ({change})")
+                change += " !"
+        previous_text = f"{previous:12.4g}" if previous is not None else f"{'-':>12}"
+        print(f"{key:45} {previous_text} {current:12.4g} {change:>8}")
+    return regressions
+
+
+async def record(cassette_path: str, topic: str, configurable: dict):
+    """Run the workflow against the real APIs and save every response."""
+    cassette = Cassette(cassette_path)
+    cassette.meta = {"topic": topic, "configurable": configurable}
+    search_api = Configuration.from_runnable_config(
+        {"configurable": configurable}
+    ).search_api
+    provider = get_search_provider(search_api)
+    register_search_provider(
+        "recording", lambda: RecordingSearchProvider(provider, cassette)
+    )
+
+    llm.model_registry.clear()
+    with mock.patch.object(
+        llm,
+        "init_chat_model",
+        make_recording_init_chat_model(llm.init_chat_model, cassette),
+    ):
+        await run_workflow(topic, {**configurable, "search_api": "recording"})
+    llm.model_registry.clear()
+
+    cassette.save()
+    print(
+        f"recorded {len(cassette.llm_calls)} model calls and "
+        f"{len(cassette.searches)} searches in {cassette_path}"
+    )
+
+
+async def main(args):
+    try:
+        return await run_benchmark(args)
+    finally:
+        await close_checkpointer(checkpointer)
+
+
+async def run_benchmark(args):
+    # Spans are logged at INFO; the collector is the only handler
+    configure_logging(level="INFO")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    if args.record:
+        configurable = {"search_api": args.search_api} if args.search_api else {}
+        await record(args.record, args.topic, configurable)
+        return True
+
+    if args.cassette:
+        cassette = Cassette.load(args.cassette)
+        scenario = Path(args.cassette).name
+        topic = cassette.meta["topic"]
+        configurable = {**cassette.meta.get("configurable", {}), "search_api": "replay"}
+        register_search_provider(
+            "replay", lambda: make_replay_search_provider(cassette, speed=args.speed)
+        )
+        init_chat_model = make_replay_init_chat_model(cassette, speed=args.speed)
+    else:
+        cassette = None
+        scenario = "stub"
+        topic = "Stub topic"
+        configurable = {"search_api": "stub"}
+        register_search_provider(
+            "stub", lambda: make_stub_search_provider(latency=0.02 / args.speed)
+        )
+        init_chat_model = make_stub_init_chat_model(latency=0.05 / args.speed)
+
+    llm.model_registry.clear()
+    with mock.patch.object(llm, "init_chat_model", init_chat_model):
+        metrics = await measure(topic, configurable, args.repeat)
+    if cassette is not None:
+        metrics["replay_misses"] = cassette.misses
+
+    baseline_path = BASELINES_DIR / f"e2e_{scenario}.json"
+    if args.update_baseline:
+        BASELINES_DIR.mkdir(exist_ok=True)
+        baseline_path.write_text(json.dumps(metrics, indent=2) + "\n")
+        print(json.dumps(metrics, indent=2))
+        print(f"baseline written to {baseline_path}")
+        return True
+
+    if cassette is not None and cassette.misses:
+        print(f"{cassette.misses} prompts were not in the cassette; re-record it")
+
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    if not baseline:
+        print(f"no baseline at {baseline_path}; store one with --update-baseline")
+    regressions = compare(metrics, baseline, json.loads(THRESHOLDS_PATH.read_text()))
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return not regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cassette", help="Replay this recorded cassette")
+    parser.add_argument("--record", help="Record a cassette into this directory")
+    parser.add_argument("--topic", default="Stub topic", help="Topic to record")
+    parser.add_argument("--search-api", help="Search provider to record")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(main(args)) else 1)
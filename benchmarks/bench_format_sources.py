@@ -0,0 +1,95 @@
+"""Micro-benchmark of source formatting over thousands of large sources.
+
+Compares `deduplicate_and_format_sources` and the streaming
+`iter_formatted_sources` against the previous `formatted_text +=`
+implementation, using sources with 600-token (~2400 character) raw bodies.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_format_sources --sources 5000
+"""
+
+import time
+import argparse
+
+import benchmarks.stubs  # noqa: F401  (sets the environment the modules expect)
+
+from src.report_writer.sources import (
+    deduplicate_and_format_sources,
+    iter_formatted_sources,
+)
+
+
+def make_search_response(n_sources, tokens_per_source=600, results_per_query=5):
+    """Build search responses holding `n_sources` distinct sources."""
+    raw_content = "lorem ipsum " * (tokens_per_source * 4 // 12)
+    results = [
+        {
+            "title": f"Title {i}",
+            "url": f"https://example.com/{i}",
+            "content": f"Snippet of source {i}. " * 10,
+            "score": 1 / (i + 1),
+            "raw_content": raw_content,
+        }
+        for i in range(n_sources)
+    ]
+    return [
+        {"query": f"query {i}", "results": results[i : i + results_per_query]}
+        for i in range(0, n_sources, results_per_query)
+    ]
+
+
+def legacy_format_sources(search_response, max_tokens_per_source, include_raw_content=True):
+    """The previous implementation, kept for comparison."""
+    sources_list = []
+    for response in search_response:
+        sources_list.extend(response["results"])
+    unique_sources = {source["url"]: source for source in sources_list}
+    formatted_text = "Sources:\n\n"
+    for source in unique_sources.values():
+        formatted_text += f"Source {source['title']}:\n===\n"
+        formatted_text += f"URL: {source['url']}\n===\n"
+        formatted_text += f"Most relevant content from source: {source['content']}\n===\n"
+        if include_raw_content:
+            char_limit = max_tokens_per_source * 4
+            raw_content = source.get("raw_content") or ""
+            if len(raw_content) > char_limit:
+                raw_content = raw_content[:char_limit] + "... [truncated]"
+            formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
+    return formatted_text.strip()
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(n_sources, repeat):
+    search_response = make_search_response(n_sources)
+    kwargs = {"max_tokens_per_source": 600, "include_raw_content": True}
+
+    legacy = best_of(lambda: legacy_format_sources(search_response, **kwargs), repeat)
+    joined = best_of(
+        lambda: deduplicate_and_format_sources(search_response, **kwargs), repeat
+    )
+    streamed = best_of(
+        lambda: sum(len(c) for c in iter_formatted_sources(search_response, **kwargs)),
+        repeat,
+    )
+
+    print(f"{n_sources} sources, best of {repeat}")
+    print(f"legacy +=:         {legacy * 1000:8.2f} ms")
+    print(f"join:              {joined * 1000:8.2f} ms")
+    print(f"streamed chunks:   {streamed * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.sources, args.repeat)
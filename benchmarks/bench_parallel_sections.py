@@ -0,0 +1,106 @@
+"""Regression benchmark: N concurrent section writers against a stub LLM.
+
+With a non-blocking model invocation path, N `write_section` tasks fanned out
+with `asyncio.gather` finish in roughly the time of one. A blocking `.invoke()`
+anywhere on that path makes the wall time grow linearly with N.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parallel_sections --sections 10 --latency 0.2
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from unittest import mock
+
+from benchmarks.stubs import (
+    make_sections,
+    make_stub_init_chat_model,
+    make_stub_search_provider,
+)
+
+from langgraph.func import entrypoint
+
+from src.report_writer import llm
+from src.report_writer.search import register_search_provider
+from src.report_writer.tasks import write_section
+
+# Follow-up and speculative searches go to the offline stub provider; task
+# calls run with the entrypoint's config, so it is passed to the entrypoint
+CONFIG = {"configurable": {"search_api": "stub"}}
+
+
+@entrypoint()
+async def write_sections(sections: list) -> list:
+    """Write every section concurrently"""
+    futures = [
+        write_section(
+            state={
+                "section": section,
+                "source_ids": [],
+                "search_iterations": 0,
+            },
+        )
+        for section in sections
+    ]
+    return await asyncio.gather(*futures)
+
+
+async def time_sections(n: int) -> float:
+    start = time.perf_counter()
+    await write_sections.ainvoke(make_sections(n), CONFIG)
+    return time.perf_counter() - start
+
+
+def make_counting_search_provider(latency: float, queries: list):
+    """Stub search provider appending every query it answers to `queries`."""
+    provider = make_stub_search_provider(latency=latency)
+    search = provider.search
+
+    async def counting_search(search_queries):
+        queries.extend(search_queries)
+        return await search(search_queries)
+
+    provider.search = counting_search
+    return provider
+
+
+async def main(n: int, latency: float, max_ratio: float) -> int:
+    stub_queries = []
+    register_search_provider(
+        "stub", lambda: make_counting_search_provider(latency, stub_queries)
+    )
+    llm.model_registry.clear()
+    with mock.patch.object(
+        llm, "init_chat_model", make_stub_init_chat_model(latency=latency)
+    ):
+        single = await time_sections(1)
+        many = await time_sections(n)
+
+    ratio = many / single
+    print(f"1 section:  {single:.3f}s")
+    print(f"{n} sections: {many:.3f}s")
+    print(f"ratio: {ratio:.2f} (budget {max_ratio:.2f})")
+    print(f"model registry: {llm.model_registry.stats()}")
+    print(f"stub search queries: {len(stub_queries)}")
+
+    # Searches must reach the stub, not a live provider
+    if not stub_queries:
+        print("FAIL: the stub search provider was not called")
+        return 1
+    if ratio > max_ratio:
+        print("FAIL: section writers are not running concurrently")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--max-ratio", type=float, default=1.5)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.sections, args.latency, args.max_ratio)))
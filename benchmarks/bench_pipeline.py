@@ -0,0 +1,107 @@
+"""End-to-end latency benchmark of the report writer with skewed stage latencies.
+
+Drives `report_writer_workflow` (plan, approval, research, writing, final
+sections) against a stub LLM and a stub search provider. Research section 1
+is slow to generate queries, section 2 slow to search and section 3 slow to
+write, so stage-wide barriers would pay every slow stage in sequence while
+per-section pipelines only pay the slowest section. The run fails when it
+takes more than `--max-ratio` of the time expected with barriers.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pipeline --fast 0.1 --slow 1.0
+"""
+
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from unittest import mock
+
+from benchmarks.stubs import (
+    make_stub_init_chat_model,
+    make_stub_search_provider,
+    section_number,
+)
+
+from langgraph.types import Command
+
+from src.report_writer import llm
+from src.report_writer.checkpointer import close_checkpointer
+from src.report_writer.search import register_search_provider
+from src.report_writer.schemas_tasks import Queries
+from src.report_writer.workflow import checkpointer, report_writer_workflow
+
+
+def make_latencies(fast: float, slow: float):
+    """Per-call latency functions skewing one stage of each research section."""
+
+    def llm_latency(prompt, schema):
+        number = section_number(prompt)
+        if schema is Queries and number == 1:
+            return slow
+        if schema is None and number == 3:
+            return slow
+        return fast
+
+    def search_latency(query):
+        return slow if section_number(query) == 2 else fast
+
+    return llm_latency, search_latency
+
+
+async def run_report(topic: str) -> float:
+    config = {"configurable": {"thread_id": str(uuid.uuid4()), "search_api": "stub"}}
+    start = time.perf_counter()
+    await report_writer_workflow.ainvoke({"topic": topic}, config)
+    # Approve the plan at the human feedback interrupt
+    result = await report_writer_workflow.ainvoke(Command(resume=True), config)
+    elapsed = time.perf_counter() - start
+    assert "final_report" in result, result
+    return elapsed
+
+
+async def main(fast: float, slow: float, max_ratio: float) -> int:
+    llm_latency, search_latency = make_latencies(fast, slow)
+    register_search_provider(
+        "stub", lambda: make_stub_search_provider(latency=search_latency)
+    )
+
+    llm.model_registry.clear()
+    try:
+        with mock.patch.object(
+            llm, "init_chat_model", make_stub_init_chat_model(latency=llm_latency)
+        ):
+            elapsed = await run_report("Stub topic")
+    finally:
+        await close_checkpointer(checkpointer)
+
+    # Planning: planner queries, planner search, plan. Final sections: one call.
+    planning = 3 * fast
+    final = fast
+    # queries -> search -> write -> grade, one slow stage per research section
+    pipelined = planning + slow + 3 * fast + final
+    barriers = planning + 3 * slow + fast + final
+
+    print(f"end-to-end:                   {elapsed:.2f}s")
+    print(f"expected with pipelines:      {pipelined:.2f}s")
+    print(f"expected with stage barriers: {barriers:.2f}s")
+
+    # Stage-wide barriers would pay every slow stage, pipelines only one
+    ratio = elapsed / barriers
+    print(f"ratio to barriers: {ratio:.2f} (budget {max_ratio:.2f})")
+    if ratio > max_ratio:
+        print("FAIL: section stages are waiting for each other")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fast", type=float, default=0.1)
+    parser.add_argument("--slow", type=float, default=1.0)
+    parser.add_argument("--max-ratio", type=float, default=0.75)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.fast, args.slow, args.max_ratio)))
@@ -0,0 +1,89 @@
+"""Startup benchmark: import time of the report writer modules against a budget.
+
+Imports each module of `startup_budget.json` in a fresh interpreter under
+`python -X importtime`, reports the median import time over several runs and
+the slowest imports, and exits with an error when a module goes over its
+budget or imports a module that must stay lazy (loaded on first use only).
+Lower the budgets in `startup_budget.json` when startup gets faster.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BUDGET_PATH = Path(__file__).resolve().parent / "startup_budget.json"
+REPOSITORY_ROOT = Path(__file__).resolve().parents[1]
+
+
+def import_times(module: str) -> dict:
+    """Cumulative import time in microseconds of every module imported by `module`."""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPOSITORY_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{completed.stderr}")
+
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(runs: int, top: int) -> bool:
+    budgets = json.loads(BUDGET_PATH.read_text())["modules"]
+    within_budget = True
+
+    for module, budget in budgets.items():
+        samples = [import_times(module) for _ in range(runs)]
+        elapsed_ms = statistics.median(sample[module] for sample in samples) / 1000
+        over = elapsed_ms > budget["budget_ms"]
+        print(
+            f"{module}: {elapsed_ms:.0f} ms (budget {budget['budget_ms']} ms)"
+            + (" OVER BUDGET" if over else "")
+        )
+
+        slowest = sorted(
+            ((name, time) for name, time in samples[-1].items() if name != module),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:top]
+        for name, time in slowest:
+            print(f"    {time / 1000:8.1f} ms  {name}")
+
+        eager = [
+            name
+            for name in budget.get("lazy_modules", [])
+            if any(
+                imported == name or imported.startswith(name + ".")
+                for imported in samples[-1]
+            )
+        ]
+        if eager:
+            print(f"    imported at startup, should be lazy: {', '.join(eager)}")
+        within_budget = within_budget and not over and not eager
+
+    return within_budget
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+    sys.exit(0 if main(args.runs, args.top) else 1)
@@ -0,0 +1,257 @@
+"""Record/replay of chat model and search responses, with their latencies.
+
+A cassette is a directory holding `llm.jsonl` (one recorded model call per
+line), `search.jsonl` (recorded search responses, in the fixtures format of
+`LocalSearchProvider`) and `meta.json` (the topic and configuration of the
+recorded run). Recording wraps the real models and search provider; replay
+serves the recorded responses after the recorded latency, scaled by `speed`.
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+from collections import deque
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from benchmarks.stubs import prompt_text
+from src.report_writer.search import LocalSearchProvider, SearchProvider
+from src.report_writer.cache import SearchCache
+
+
+def schema_name(schema) -> str:
+    return schema.__name__ if schema is not None else ""
+
+
+def prompt_key(provider: str, model: str, schema, messages) -> str:
+    payload = "\x1f".join([provider, model, schema_name(schema), prompt_text(messages)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded model calls and search responses of one workflow run."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.meta = {}
+        self.llm_calls = []
+        self.searches = []
+        self.hits = 0
+        self.misses = 0
+        self._by_key = {}
+        self._fallbacks = {}
+        self._search_latencies = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        cassette = cls(path)
+        cassette.meta = json.loads((cassette.path / "meta.json").read_text())
+        with open(cassette.path / "llm.jsonl", encoding="utf-8") as f:
+            cassette.llm_calls = [json.loads(line) for line in f if line.strip()]
+        with open(cassette.path / "search.jsonl", encoding="utf-8") as f:
+            cassette.searches = [json.loads(line) for line in f if line.strip()]
+        for entry in cassette.llm_calls:
+            cassette._by_key.setdefault(entry["key"], deque()).append(entry)
+        cassette._search_latencies = {
+            SearchCache.normalize_query(entry["query"]): entry["latency"]
+            for entry in cassette.searches
+        }
+        return cassette
+
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / "meta.json").write_text(json.dumps(self.meta, indent=2))
+        with open(self.path / "llm.jsonl", "w", encoding="utf-8") as f:
+            for entry in self.llm_calls:
+                f.write(json.dumps(entry) + "\n")
+        with open(self.path / "search.jsonl", "w", encoding="utf-8") as f:
+            for entry in self.searches:
+                f.write(json.dumps(entry) + "\n")
+
+    def record_llm(self, provider, model, schema, messages, latency, response):
+        entry = {
+            "key": prompt_key(provider, model, schema, messages),
+            "provider": provider,
+            "model": model,
+            "schema": schema_name(schema),
+            "latency": latency,
+        }
+        if schema is not None:
+            entry["structured"] = response.model_dump()
+        else:
+            entry["content"] = response.content
+            entry["usage"] = getattr(response, "usage_metadata", None)
+        with self._lock:
+            self.llm_calls.append(entry)
+
+    def record_search(self, response: dict, latency: float):
+        with self._lock:
+            self.searches.append({**response, "latency": latency})
+
+    def replay_llm(self, provider, model, schema, messages) -> dict:
+        """
+        Recorded call for the prompt. Prompts that changed since recording
+        (a miss) get the recorded calls of the same model and schema in
+        recording order, so a stale cassette still drives the whole run.
+        """
+        with self._lock:
+            matches = self._by_key.get(prompt_key(provider, model, schema, messages))
+            if matches:
+                self.hits += 1
+                # Repeated identical prompts replay their calls in order
+                entry = matches[0]
+                matches.rotate(-1)
+                return entry
+
+            self.misses += 1
+            fallback_key = (provider, model, schema_name(schema))
+            fallback = self._fallbacks.get(fallback_key)
+            if fallback is None:
+                fallback = self._fallbacks[fallback_key] = deque(
+                    entry
+                    for entry in self.llm_calls
+                    if (entry["provider"], entry["model"], entry["schema"])
+                    == fallback_key
+                )
+            if not fallback:
+                raise KeyError(f"No recorded calls of {fallback_key} in {self.path}")
+            entry = fallback[0]
+            fallback.rotate(-1)
+            return entry
+
+    def search_latency(self, query: str) -> float:
+        return self._search_latencies.get(SearchCache.normalize_query(query), 0.0)
+
+
+class RecordingChatModel:
+    """Wraps a chat model and records every call and its latency in a cassette."""
+
+    def __init__(self, model, cassette: Cassette, provider: str, model_name: str, schema=None):
+        self.model = model
+        self.cassette = cassette
+        self.provider = provider
+        self.model_name = model_name
+        self.schema = schema
+
+    def with_structured_output(self, schema):
+        return RecordingChatModel(
+            self.model.with_structured_output(schema),
+            self.cassette,
+            self.provider,
+            self.model_name,
+            schema=schema,
+        )
+
+    def _record(self, messages, start, response):
+        self.cassette.record_llm(
+            self.provider,
+            self.model_name,
+            self.schema,
+            messages,
+            time.perf_counter() - start,
+            response,
+        )
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        start = time.perf_counter()
+        response = await self.model.ainvoke(messages, *args, **kwargs)
+        self._record(messages, start, response)
+        return response
+
+    async def astream(self, messages, *args, **kwargs):
+        start = time.perf_counter()
+        response = None
+        async for chunk in self.model.astream(messages, *args, **kwargs):
+            response = chunk if response is None else response + chunk
+            yield chunk
+        self._record(messages, start, response)
+
+
+class ReplayChatModel:
+    """Serves recorded responses of a cassette after their recorded latency."""
+
+    def __init__(self, cassette: Cassette, provider: str, model_name: str, schema=None, speed=1.0):
+        self.cassette = cassette
+        self.provider = provider
+        self.model_name = model_name
+        self.schema = schema
+        self.speed = speed
+
+    def with_structured_output(self, schema):
+        return ReplayChatModel(
+            self.cassette, self.provider, self.model_name, schema=schema, speed=self.speed
+        )
+
+    async def _replay(self, messages) -> dict:
+        entry = self.cassette.replay_llm(
+            self.provider, self.model_name, self.schema, messages
+        )
+        await asyncio.sleep(entry["latency"] / self.speed)
+        return entry
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        entry = await self._replay(messages)
+        if self.schema is not None:
+            return self.schema.model_validate(entry["structured"])
+        return AIMessage(content=entry["content"], usage_metadata=entry.get("usage"))
+
+    async def astream(self, messages, *args, **kwargs):
+        entry = await self._replay(messages)
+        yield AIMessageChunk(content=entry["content"], usage_metadata=entry.get("usage"))
+
+
+def make_recording_init_chat_model(init_chat_model, cassette: Cassette):
+    """Wrap `init_chat_model` so every model it builds records into the cassette."""
+
+    def recording_init_chat_model(model, model_provider, **kwargs):
+        return RecordingChatModel(
+            init_chat_model(model=model, model_provider=model_provider, **kwargs),
+            cassette,
+            model_provider,
+            model,
+        )
+
+    return recording_init_chat_model
+
+
+def make_replay_init_chat_model(cassette: Cassette, speed=1.0):
+    """Replacement for `init_chat_model` serving the cassette's recorded responses."""
+
+    def replay_init_chat_model(model, model_provider, **kwargs):
+        return ReplayChatModel(cassette, model_provider, model, speed=speed)
+
+    return replay_init_chat_model
+
+
+class RecordingSearchProvider(SearchProvider):
+    """Wraps a search provider and records its responses and latencies."""
+
+    def __init__(self, provider: SearchProvider, cassette: Cassette):
+        self.provider = provider
+        self.cassette = cassette
+        self.name = provider.name
+        self.supports_raw_content = provider.supports_raw_content
+        self.supports_scores = provider.supports_scores
+
+    async def search(self, queries: list[str]) -> list[dict]:
+        start = time.perf_counter()
+        responses = await self.provider.search(queries)
+        latency = time.perf_counter() - start
+        for response in responses:
+            self.cassette.record_search(response, latency)
+        return responses
+
+    def format_sources(self, responses) -> str:
+        return self.provider.format_sources(responses)
+
+
+def make_replay_search_provider(cassette: Cassette, speed=1.0) -> LocalSearchProvider:
+    """Local provider replaying the cassette's searches after their recorded latency."""
+    return LocalSearchProvider(
+        fixtures_path=str(cassette.path / "search.jsonl"),
+        latency=lambda query: cassette.search_latency(query) / speed,
+    )
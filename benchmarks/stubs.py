@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import asyncio
+from pathlib import Path
+
+# The report writer modules read these when they are imported or first used
+os.environ.setdefault(
+    "CONFIG_FILEPATH",
+    str(Path(__file__).resolve().parents[1] / "src" / "report_writer" / "config.yaml"),
+)
+os.environ.setdefault("SEARCH_CACHE_TTL", "0")
+os.environ.setdefault("LLM_CACHE_TTL", "0")
+os.environ.setdefault("CHECKPOINTER", "memory")
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from src.report_writer.schemas_tasks import (
+    Queries,
+    SearchQuery,
+    Section,
+    Sections,
+    SectionGraderOutput,
+    FastSectionGraderOutput,
+)
+from src.report_writer.search import LocalSearchProvider
+
+
+class StubChatModel:
+    """Local stand-in for a chat model with a fixed response latency.
+
+    `invoke` blocks the calling thread for `latency` seconds and `ainvoke`
+    awaits for the same amount (as does `astream` before its first chunk),
+    so benchmarks can tell a blocking call path from a non-blocking one. `latency` can also be a function of the prompt
+    text and the structured-output schema, to skew latencies per section.
+    """
+
+    def __init__(self, latency=0.2, content=None, schema=None, grade="pass"):
+        self.latency = latency
+        self.content = content or "## Stub section\n\n**Stub insight.** Stub body."
+        self.schema = schema
+        self.grade = grade
+
+    def with_structured_output(self, schema):
+        return StubChatModel(
+            latency=self.latency, content=self.content, schema=schema, grade=self.grade
+        )
+
+    def _latency(self, messages):
+        if callable(self.latency):
+            return self.latency(prompt_text(messages), self.schema)
+        return self.latency
+
+    def invoke(self, messages, *args, **kwargs):
+        time.sleep(self._latency(messages))
+        return self._respond(messages)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        await asyncio.sleep(self._latency(messages))
+        return self._respond(messages)
+
+    async def astream(self, messages, *args, **kwargs):
+        # Plain text only, streamed word by word once the latency has passed
+        await asyncio.sleep(self._latency(messages))
+        for word in re.findall(r"\S+\s*", self.content):
+            yield AIMessageChunk(content=word)
+
+    def _respond(self, messages):
+        if self.schema is None:
+            return AIMessage(content=self.content)
+        if self.schema is Queries:
+            # Distinct queries per section, so searches are not all deduplicated
+            number = section_number(prompt_text(messages))
+            return Queries(
+                queries=[SearchQuery(search_query=f"section {number} query")]
+            )
+        if self.schema is SectionGraderOutput:
+            return SectionGraderOutput(grade=self.grade, follow_up_queries=[])
+        if self.schema is FastSectionGraderOutput:
+            return FastSectionGraderOutput(
+                grade=self.grade, follow_up_queries=[], confidence=1.0
+            )
+        if self.schema is Sections:
+            return Sections(sections=make_plan(3))
+        raise ValueError(f"Unsupported structured output schema: {self.schema}")
+
+
+def make_stub_init_chat_model(latency=0.2, **kwargs):
+    """Return a drop-in replacement for `init_chat_model` serving stub models."""
+
+    def init_chat_model(*args, **init_kwargs):
+        return StubChatModel(latency=latency, **kwargs)
+
+    return init_chat_model
+
+
+def make_sections(n, research=True):
+    """Build `n` empty report sections."""
+    return [
+        Section(
+            section_number=i,
+            name=f"Section {i}",
+            description=f"Stub description of section {i}",
+            research=research,
+            content="",
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def make_plan(n_research):
+    """Build a report plan: introduction, `n_research` research sections, conclusion."""
+    introduction, conclusion = make_sections(2, research=False)
+    introduction.name, conclusion.name = "Introduction", "Conclusion"
+    introduction.description = "Overview of the stub topic"
+    conclusion.description = "Summary of the stub topic"
+    research_sections = [
+        section.model_copy(update={"section_number": section.section_number + 1})
+        for section in make_sections(n_research)
+    ]
+    conclusion.section_number = n_research + 2
+    return [introduction, *research_sections, conclusion]
+
+
+def prompt_text(messages) -> str:
+    """Concatenate the content of prompt messages."""
+    return "\n".join(str(message.content) for message in messages)
+
+
+def section_number(text: str):
+    """Number of the stub section a prompt or query is about, if any."""
+    match = re.search(r"section (\d+)", text, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def make_stub_corpus(n_sections=10, documents_per_section=3):
+    """Build corpus documents about each stub section, for the local search provider."""
+    return [
+        {
+            "title": f"Document {i} about section {number}",
+            "url": f"https://example.com/section-{number}/{i}",
+            "content": f"Full text {i} about section {number} of the stub topic. " * 50,
+        }
+        for number in range(1, n_sections + 1)
+        for i in range(documents_per_section)
+    ]
+
+
+def make_stub_search_provider(latency=0.1, results_per_query=3):
+    """
+    Return an offline `LocalSearchProvider` over a stub corpus.
+
+    `latency` is seconds per query, or a function of the query returning it.
+    """
+    return LocalSearchProvider(
+        documents=make_stub_corpus(),
+        latency=latency,
+        max_results=results_per_query,
+    )
@@ -0,0 +1,241 @@
+"""Batch generation of many reports under one global budget.
+
+Run from the repository root with a file of topics, one per line:
+
+    python -m src.report_writer.batch topics.txt --batch-id nightly --output reports.jsonl
+"""
+
+import time
+import uuid
+import json
+import asyncio
+import argparse
+from typing import Optional, Union
+
+from langgraph.types import Command
+
+from src.report_writer.checkpointer import close_checkpointer
+from src.report_writer.llm import llm_budget
+from src.report_writer.ratelimit import get_rate_limiter, rate_limiters
+from src.report_writer.search import search_provider_factories
+from src.report_writer.telemetry import collect, logger
+from src.report_writer.workflow import checkpointer, report_writer_workflow
+
+
+def batch_thread_id(batch_id: str, index: int) -> str:
+    """Checkpoint thread of a report in a batch; stable, so batches can resume."""
+    return f"{batch_id}:{index}"
+
+
+async def interrupted(config: dict) -> bool:
+    """Whether the thread is paused at an interrupt, e.g. the plan review."""
+    state = await report_writer_workflow.aget_state(config)
+    return any(task.interrupts for task in state.tasks)
+
+
+async def run_report(item: dict, config: dict, max_plan_reviews: int = 3) -> dict:
+    """
+    Run, or resume, one report of a batch to completion.
+
+    A thread that already finished returns its saved report, a thread that
+    stopped part way is resumed from its last checkpoint, and interactive
+    plan reviews are approved.
+    """
+    state = await report_writer_workflow.aget_state(config)
+    if state.values and not state.next and "final_report" in state.values:
+        return {"final_report": state.values["final_report"], "resumed": True}
+
+    if state.next:
+        workflow_input = Command(resume=True) if await interrupted(config) else None
+    else:
+        workflow_input = {"topic": item["topic"]}
+        if item.get("sections") is not None:
+            workflow_input["approved_sections"] = item["sections"]
+
+    result = await report_writer_workflow.ainvoke(workflow_input, config)
+    for _ in range(max_plan_reviews):
+        if not await interrupted(config):
+            break
+        result = await report_writer_workflow.ainvoke(Command(resume=True), config)
+    else:
+        raise RuntimeError(f"Plan review of {item['topic']!r} was not approved")
+
+    return {"final_report": result["final_report"], "resumed": False}
+
+
+async def run_batch(
+    topics: list[Union[str, dict]],
+    batch_id: Optional[str] = None,
+    max_concurrent_reports: int = 4,
+    llm_concurrency: Optional[int] = None,
+    search_concurrency: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+    input_cost_per_million: float = 0.0,
+    output_cost_per_million: float = 0.0,
+    configurable: Optional[dict] = None,
+) -> dict:
+    """
+    Generate a report for every topic under one global budget.
+
+    All reports run in this process, so they share the chat model clients,
+    the search cache (including searches in flight) and the search rate
+    limiters. The budgets cap model calls, search calls and tokens across
+    all reports, and are restored when the batch ends. Each report is
+    checkpointed on its own thread of `batch_id`; running the same batch id
+    again skips finished reports and resumes unfinished ones.
+
+    Args:
+        topics: Topics, or dicts with a `topic` and optionally pre-approved
+            `sections` (Section objects or dicts) that skip planning
+        batch_id: Id of the batch, generated when omitted
+        max_concurrent_reports: Reports running at the same time
+        llm_concurrency: Cap on concurrent model calls, replacing the
+            configured one when given
+        search_concurrency: Cap on concurrent calls to each search
+            provider, including local and registered ones
+        tokens_per_minute: Cap on model tokens per minute, replacing the
+            configured one when given
+        input_cost_per_million: Price of one million prompt tokens
+        output_cost_per_million: Price of one million output tokens
+        configurable: Configuration values for every report; plans are
+            approved without an interrupt (`plan_approval: auto`) by default
+
+    Returns:
+        dict: `reports` in topic order, each with its topic, thread id,
+        final report or error, duration, tokens and cost, and `stats` with
+        the batch throughput in reports per hour and the cost per report.
+    """
+    batch_id = batch_id or str(uuid.uuid4())
+    items = [{"topic": item} if isinstance(item, str) else item for item in topics]
+
+    # Only the limits given override those configured in the environment
+    previous_budget = (llm_budget.max_concurrency, llm_budget.tokens_per_minute)
+    previous_search = {}
+    llm_budget.configure(
+        llm_concurrency or llm_budget.max_concurrency,
+        tokens_per_minute or llm_budget.tokens_per_minute,
+    )
+    if search_concurrency:
+        for provider in search_provider_factories:
+            # None marks a limiter created for the batch, removed afterwards
+            previous_search[provider] = (
+                rate_limiters[provider].max_concurrency
+                if provider in rate_limiters
+                else None
+            )
+            get_rate_limiter(provider).set_max_concurrency(search_concurrency)
+
+    reports_semaphore = asyncio.Semaphore(max_concurrent_reports)
+
+    async def run_item(index: int, item: dict) -> dict:
+        thread_id = batch_thread_id(batch_id, index)
+        config = {
+            "configurable": {
+                "plan_approval": "auto",
+                **(configurable or {}),
+                "thread_id": thread_id,
+            }
+        }
+        report = {"topic": item["topic"], "thread_id": thread_id}
+        async with reports_semaphore:
+            with collect("batch_report", thread_id=thread_id) as usage:
+                try:
+                    report.update(await run_report(item, config))
+                except Exception as e:
+                    logger.exception("report %s failed", thread_id)
+                    report["error"] = repr(e)
+        input_tokens = usage.counters.get("input_tokens", 0) + usage.counters.get(
+            "input_tokens_estimated", 0
+        )
+        output_tokens = usage.counters.get("output_tokens", 0)
+        report.update(
+            duration=usage.duration,
+            llm_calls=usage.counters.get("llm_calls", 0),
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cost=(
+                input_tokens * input_cost_per_million
+                + output_tokens * output_cost_per_million
+            )
+            / 1_000_000,
+        )
+        return report
+
+    start = time.perf_counter()
+    try:
+        reports = await asyncio.gather(
+            *(run_item(index, item) for index, item in enumerate(items))
+        )
+    finally:
+        llm_budget.configure(*previous_budget)
+        for provider, max_concurrency in previous_search.items():
+            if max_concurrency is None:
+                rate_limiters.pop(provider, None)
+            else:
+                get_rate_limiter(provider).set_max_concurrency(max_concurrency)
+    elapsed = time.perf_counter() - start
+
+    completed = [report for report in reports if "error" not in report]
+    total_cost = sum(report["cost"] for report in reports)
+    stats = {
+        "batch_id": batch_id,
+        "reports": len(reports),
+        "completed": len(completed),
+        "failed": len(reports) - len(completed),
+        "resumed": sum(1 for report in completed if report["resumed"]),
+        "elapsed_seconds": elapsed,
+        "reports_per_hour": len(completed) / elapsed * 3600 if elapsed else 0.0,
+        "input_tokens": sum(report["input_tokens"] for report in reports),
+        "output_tokens": sum(report["output_tokens"] for report in reports),
+        "total_cost": total_cost,
+        "cost_per_report": total_cost / len(completed) if completed else 0.0,
+    }
+    logger.info(
+        "batch %s: %d/%d reports, %.1f reports/hour, %.4f per report",
+        batch_id,
+        stats["completed"],
+        stats["reports"],
+        stats["reports_per_hour"],
+        stats["cost_per_report"],
+        extra=stats,
+    )
+    return {"reports": reports, "stats": stats}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("topics", help="File with one topic per line")
+    parser.add_argument("--batch-id", help="Reuse to resume an earlier batch")
+    parser.add_argument("--output", help="JSON lines file for the reports")
+    parser.add_argument("--max-concurrent-reports", type=int, default=4)
+    parser.add_argument("--llm-concurrency", type=int)
+    parser.add_argument("--search-concurrency", type=int)
+    parser.add_argument("--tokens-per-minute", type=int)
+    parser.add_argument("--input-cost-per-million", type=float, default=0.0)
+    parser.add_argument("--output-cost-per-million", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with open(args.topics, encoding="utf-8") as f:
+        topics = [line.strip() for line in f if line.strip()]
+
+    async def main():
+        try:
+            return await run_batch(
+                topics,
+                batch_id=args.batch_id,
+                max_concurrent_reports=args.max_concurrent_reports,
+                llm_concurrency=args.llm_concurrency,
+                search_concurrency=args.search_concurrency,
+                tokens_per_minute=args.tokens_per_minute,
+                input_cost_per_million=args.input_cost_per_million,
+                output_cost_per_million=args.output_cost_per_million,
+            )
+        finally:
+            await close_checkpointer(checkpointer)
+
+    result = asyncio.run(main())
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for report in result["reports"]:
+                f.write(json.dumps(report, default=str) + "\n")
+    print(json.dumps(result["stats"], indent=2))
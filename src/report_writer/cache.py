@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+
+from src.report_writer.telemetry import record
+
+
+class SearchCache:
+    """
+    Persistent, content-addressed cache of search responses backed by SQLite.
+
+    Entries are keyed on the provider, the normalized query and the search
+    parameters. They expire after `ttl_seconds`, and the least recently used
+    entries are evicted once the cache holds more than `max_entries`.
+    Concurrent requests for the same key share a single provider call.
+
+    Args:
+        path: Location of the SQLite database file
+        ttl_seconds: Lifetime of an entry, 0 disables the cache
+        max_entries: Maximum number of entries kept on disk
+    """
+
+    # Subclasses caching other responses keep them in their own table
+    table = "search_cache"
+    hits_counter = "search_cache_hits"
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._conn = None
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase the query and collapse whitespace."""
+        return " ".join(query.lower().split())
+
+    @classmethod
+    def make_key(cls, provider: str, query: str, **params) -> str:
+        """Hash the provider, normalized query and search parameters."""
+        payload = json.dumps(
+            {
+                "provider": provider,
+                "query": cls.normalize_query(query),
+                "params": params,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        # Open the database on first use so importing never touches the disk
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at "
+                f"ON {self.table} (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str):
+        """Return the cached response for `key`, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, provider: str, query: str, value):
+        """Store a response and evict the least recently used overflow."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} "
+                "(key, provider, query, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, query, json.dumps(value), now, now),
+            )
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.commit()
+            self.hits = 0
+            self.misses = 0
+            self.coalesced = 0
+
+    def stats(self) -> dict:
+        """Return hit, miss and coalesced-request counters."""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+    def should_cache(self, value) -> bool:
+        """Whether to store a response; search responses without results are not."""
+        return bool(value.get("results"))
+
+    async def get_or_fetch(self, provider: str, query: str, fetch, **params):
+        """
+        Return the cached response for the query or run `fetch()` to get it.
+
+        Only one `fetch()` runs per key at a time; concurrent callers for the
+        same key await its result instead of calling the provider again. The
+        fetch runs in its own task, so a caller that is cancelled stops
+        waiting without cancelling it for the others, and its response is
+        still cached. Responses that `should_cache` rejects are returned but
+        not cached. The database is read and written in a worker thread.
+        """
+        if not self.enabled:
+            return await fetch()
+
+        key = self.make_key(provider, query, **params)
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            self.hits += 1
+            record(self.hits_counter)
+            return cached
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get((loop, key))
+        if inflight is not None:
+            self.coalesced += 1
+            record(self.hits_counter)
+        else:
+            self.misses += 1
+            inflight = loop.create_task(self._fetch_and_set(key, provider, query, fetch))
+            self._inflight[(loop, key)] = inflight
+            inflight.add_done_callback(
+                lambda task: self._fetch_done(loop, key, task)
+            )
+        return await asyncio.shield(inflight)
+
+    def _fetch_done(self, loop, key: str, task):
+        del self._inflight[(loop, key)]
+        # Retrieve the exception so a fetch no caller awaits any more is not
+        # reported as never retrieved
+        task.cancelled() or task.exception()
+
+    async def _fetch_and_set(self, key: str, provider: str, query: str, fetch):
+        value = await fetch()
+        if self.should_cache(value):
+            await asyncio.to_thread(self.set, key, provider, query, value)
+        return value
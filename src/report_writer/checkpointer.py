@@ -0,0 +1,313 @@
+import os
+import time
+import zlib
+import atexit
+import asyncio
+from typing import Optional, TYPE_CHECKING
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+# aiosqlite and the SQLite saver are imported when the database is opened
+if TYPE_CHECKING:
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+
+class CompressedSerializer(SerializerProtocol):
+    """
+    Serializer that zlib-compresses large payloads of another serializer.
+
+    Checkpoints of a report carry sections and search results, which
+    compress well. Payloads below `min_size` bytes are stored as is.
+    """
+
+    SUFFIX = "+zlib"
+
+    def __init__(
+        self,
+        serde: Optional[SerializerProtocol] = None,
+        min_size: int = 1024,
+        level: int = 6,
+    ):
+        self.serde = serde or JsonPlusSerializer()
+        self.min_size = min_size
+        self.level = level
+
+    def dumps(self, obj):
+        return self.serde.dumps(obj)
+
+    def loads(self, data):
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj):
+        type_, data = self.serde.dumps_typed(obj)
+        if data is not None and len(data) >= self.min_size:
+            return type_ + self.SUFFIX, zlib.compress(data, self.level)
+        return type_, data
+
+    def loads_typed(self, data):
+        type_, payload = data
+        if type_.endswith(self.SUFFIX):
+            return self.serde.loads_typed(
+                (type_[: -len(self.SUFFIX)], zlib.decompress(payload))
+            )
+        return self.serde.loads_typed(data)
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """
+    Durable SQLite checkpointer that can be created at import time.
+
+    `AsyncSqliteSaver` must be built inside a running event loop, while the
+    entrypoints need their checkpointer when the module is imported. This
+    saver opens the database on first use and delegates to an
+    `AsyncSqliteSaver`, adding compaction and garbage collection of
+    completed threads on top.
+
+    Close it with `aclose()`, or use it as an async context manager, once
+    the process is done with it. A connection left open is closed at exit,
+    and its worker thread never holds up interpreter shutdown.
+
+    Args:
+        path: Location of the SQLite database file
+        retention_seconds: How long a completed thread is kept before
+            `agc_completed` deletes it
+        serde: Serializer for checkpoints and writes, compressing by default
+    """
+
+    def __init__(
+        self,
+        path: str,
+        retention_seconds: float = 24 * 60 * 60,
+        serde: Optional[SerializerProtocol] = None,
+    ):
+        super().__init__(serde=serde or CompressedSerializer())
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._saver = None
+        self._saver_lock = None
+
+    async def _get_saver(self) -> "AsyncSqliteSaver":
+        if self._saver is None:
+            if self._saver_lock is None:
+                self._saver_lock = asyncio.Lock()
+            async with self._saver_lock:
+                if self._saver is None:
+                    import aiosqlite
+                    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    conn = aiosqlite.connect(self.path)
+                    # Every write is committed, so the worker thread must not
+                    # keep a finished process alive
+                    conn.daemon = True
+                    await conn
+                    try:
+                        saver = AsyncSqliteSaver(conn, serde=self.serde)
+                        await saver.setup()
+                        await conn.execute(
+                            """CREATE TABLE IF NOT EXISTS completed_threads (
+                                thread_id TEXT PRIMARY KEY,
+                                completed_at REAL NOT NULL
+                            )"""
+                        )
+                        await conn.commit()
+                    except BaseException:
+                        await conn.close()
+                        raise
+                    self._saver = saver
+                    atexit.register(self._close_at_exit)
+        return self._saver
+
+    async def aclose(self):
+        """Close the database connection; the next call opens it again."""
+        saver = self._saver
+        if saver is None:
+            return
+        self._saver = None
+        self._saver_lock = None
+        atexit.unregister(self._close_at_exit)
+        await saver.conn.close()
+
+    def _close_at_exit(self):
+        # Fallback for processes that never called aclose()
+        try:
+            asyncio.run(self.aclose())
+        except Exception:
+            pass
+
+    async def __aenter__(self) -> "SqliteCheckpointer":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _require_saver(self) -> "AsyncSqliteSaver":
+        if self._saver is None:
+            raise RuntimeError(
+                "SqliteCheckpointer is opened by its first async call; "
+                "use the async API before the sync one."
+            )
+        return self._saver
+
+    # Async interface used by the workflows
+
+    async def aget_tuple(self, config: RunnableConfig):
+        return await (await self._get_saver()).aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        saver = await self._get_saver()
+        async for checkpoint_tuple in saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await (await self._get_saver()).aput(
+            config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await (await self._get_saver()).aput_writes(
+            config, writes, task_id, task_path
+        )
+
+    # Sync interface, e.g. for get_state from another thread
+
+    def get_tuple(self, config: RunnableConfig):
+        return self._require_saver().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        return self._require_saver().list(
+            config, filter=filter, before=before, limit=limit
+        )
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        return self._require_saver().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        return self._require_saver().put_writes(config, writes, task_id, task_path)
+
+    def get_next_version(self, current, channel):
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        return AsyncSqliteSaver.get_next_version(self, current, channel)
+
+    # Maintenance
+
+    async def _execute(self, *statements):
+        saver = await self._get_saver()
+        async with saver.lock:
+            for sql, params in statements:
+                await saver.conn.execute(sql, params)
+            await saver.conn.commit()
+
+    async def acompact(self, thread_id: str, keep_last: int = 1):
+        """Delete all but the `keep_last` latest checkpoints of a thread, per namespace."""
+        await self._execute(
+            (
+                """DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY checkpoint_ns ORDER BY checkpoint_id DESC
+                        ) AS position
+                        FROM checkpoints WHERE thread_id = ?
+                    ) WHERE position > ?
+                )""",
+                (thread_id, keep_last),
+            ),
+            (
+                """DELETE FROM writes WHERE thread_id = ? AND NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = writes.thread_id
+                    AND c.checkpoint_ns = writes.checkpoint_ns
+                    AND c.checkpoint_id = writes.checkpoint_id
+                )""",
+                (thread_id,),
+            ),
+        )
+
+    async def adelete_thread(self, thread_id: str):
+        """Delete every checkpoint and write of a thread."""
+        await self._execute(
+            ("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)),
+            ("DELETE FROM writes WHERE thread_id = ?", (thread_id,)),
+            ("DELETE FROM completed_threads WHERE thread_id = ?", (thread_id,)),
+        )
+
+    async def amark_completed(self, thread_id: str):
+        """
+        Record that a thread finished, compact it to its final checkpoint and
+        collect threads whose retention period is over.
+        """
+        await self._execute(
+            (
+                "INSERT OR REPLACE INTO completed_threads (thread_id, completed_at) "
+                "VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+        )
+        await self.acompact(thread_id)
+        await self.agc_completed()
+
+    async def agc_completed(self, retention_seconds: Optional[float] = None):
+        """Delete threads that completed more than `retention_seconds` ago."""
+        if retention_seconds is None:
+            retention_seconds = self.retention_seconds
+        cutoff = time.time() - retention_seconds
+        expired = "SELECT thread_id FROM completed_threads WHERE completed_at < ?"
+        await self._execute(
+            (f"DELETE FROM checkpoints WHERE thread_id IN ({expired})", (cutoff,)),
+            (f"DELETE FROM writes WHERE thread_id IN ({expired})", (cutoff,)),
+            ("DELETE FROM completed_threads WHERE completed_at < ?", (cutoff,)),
+        )
+
+
+def make_memory_checkpointer() -> BaseCheckpointSaver:
+    return MemorySaver()
+
+
+def make_sqlite_checkpointer() -> BaseCheckpointSaver:
+    return SqliteCheckpointer(
+        path=os.getenv("CHECKPOINT_DB_PATH", ".cache/checkpoints.sqlite"),
+        retention_seconds=float(
+            os.getenv("CHECKPOINT_RETENTION_SECONDS", 24 * 60 * 60)
+        ),
+    )
+
+
+checkpointer_factories = {
+    "memory": make_memory_checkpointer,
+    "sqlite": make_sqlite_checkpointer,
+}
+
+
+def register_checkpointer(name: str, factory):
+    """Register a factory building a checkpointer backend, e.g. for Postgres."""
+    checkpointer_factories[name] = factory
+
+
+def make_checkpointer(backend: Optional[str] = None) -> BaseCheckpointSaver:
+    """Build the checkpointer selected by `backend` or the CHECKPOINTER env var."""
+    backend = backend or os.getenv("CHECKPOINTER", "sqlite")
+    if backend not in checkpointer_factories:
+        raise ValueError(f"Unsupported checkpointer backend: {backend}")
+    return checkpointer_factories[backend]()
+
+
+async def close_checkpointer(checkpointer: BaseCheckpointSaver):
+    """Close the checkpointer's connections, if it holds any."""
+    if hasattr(checkpointer, "aclose"):
+        await checkpointer.aclose()
+
+
+async def mark_thread_completed(checkpointer: BaseCheckpointSaver, config: RunnableConfig):
+    """Let the checkpointer compact and later collect a finished thread."""
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    if thread_id is not None and hasattr(checkpointer, "amark_completed"):
+        await checkpointer.amark_completed(thread_id)
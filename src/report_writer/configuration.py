@@ -1,10 +1,12 @@
 import os
+import json
+import threading
 from enum import Enum
-from dataclasses import dataclass, fields
-from typing import Any, Optional
+from dataclasses import dataclass, field, fields
+from typing import Any, Optional, Union, get_args, get_origin
 
+import yaml
 from langchain_core.runnables import RunnableConfig
-from dataclasses import dataclass
 
 from src.report_writer.utils import load_config
 
@@ -15,44 +17,181 @@ class WriterProvider(Enum):
     GROQ = "groq"
 
 
-@dataclass(kw_only=True)
+DEFAULT_REPORT_STRUCTURE = """Use this structure to create a report on the user-provided topic:
+
+### Introduction (no research needed)
+   - Brief overview of the topic area
+
+### Main Body Sections:
+   - Each section should focus on a sub-topic of the user-provided topic
+
+### Conclusion
+   - Aim for 1 structural element (either a list or table) that distills the main body sections
+   - Provide a concise summary of the report
+"""
+
+# Keys of config.yaml named differently from their Configuration field
+YAML_KEYS = {"report_structure": "default_report_structure"}
+
+PLAN_APPROVAL_POLICIES = ("interactive", "auto", "grader")
+
+
+def coerce(value, annotation):
+    """Convert a value given as a string (e.g. from the environment) to a field's type."""
+    if get_origin(annotation) is Union:
+        annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+    if not isinstance(value, str) or annotation is str:
+        return float(value) if annotation is float and isinstance(value, int) else value
+    if annotation is bool:
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if annotation in (int, float):
+        return annotation(value)
+    if annotation is dict:
+        return yaml.safe_load(value)
+    return value
+
+
+@dataclass(kw_only=True, frozen=True)
 class Configuration:
-    """The configurable fields for the chatbot."""
+    """The configurable fields for the chatbot.
 
-    config_yaml = load_config()
+    Defaults are built in; config.yaml (at CONFIG_FILEPATH) overrides them,
+    the `configurable` of a RunnableConfig overrides the file, and
+    environment variables named after the fields override both.
+    """
 
-    report_structure: str = config_yaml["default_report_structure"]
-    number_of_queries: int = config_yaml["number_of_queries"]
+    report_structure: str = DEFAULT_REPORT_STRUCTURE
+    number_of_queries: int = 2
     max_search_depth: int = 2  # Maximum number of reflection + search iterations
+    # Search on the section topic while a section is graded, ahead of a failing grade
+    speculative_prefetch: bool = True
+
+    planner_provider: str = "groq"
+    planner_model: str = "gemma2-9b-it"
 
-    planner_provider: str = config_yaml["planner_provider"]
-    planner_model: str = config_yaml["planner_model"]
+    # How report plans are approved: interactive, auto or grader
+    plan_approval: str = "interactive"
+    # Plan revisions on a failing grade before the plan is approved anyway
+    max_plan_revisions: int = 2
+    plan_grader_provider: str = "groq"
+    plan_grader_model: str = "llama-3.1-8b-instant"
 
-    query_writer_provider: str = config_yaml["query_writer_provider"]
-    query_writer_model: str = config_yaml["query_writer_model"]
+    query_writer_provider: str = "groq"
+    query_writer_model: str = "mixtral-8x7b-32768"
 
-    section_writer_provider: str = config_yaml["section_writer_provider"]
-    section_writer_model: str = config_yaml["section_writer_model"]
+    section_writer_provider: str = "groq"
+    section_writer_model: str = "mixtral-8x7b-32768"
+
+    section_grader_provider: str = "groq"
+    section_grader_model: str = "llama-3.1-8b-instant"
+
+    # Grade sections with local heuristics, then the fast grader model if
+    # set, and call the section grader only when neither is confident
+    grading_cascade: bool = True
+    grading_heuristics: dict = field(
+        default_factory=lambda: {
+            "min_words": 150,
+            "min_citations": 2,
+            "min_term_coverage": 0.6,
+        }
+    )
+    fast_section_grader_provider: str = "groq"
+    fast_section_grader_model: Optional[str] = None
+    # Confidence from which the fast grader's grade is final
+    fast_grader_min_confidence: float = 0.8
 
-    section_grader_provider: str = config_yaml["section_grader_provider"]
-    section_grader_model: str = config_yaml["section_grader_model"]
+    final_section_writer_provider: str = "groq"
+    final_section_writer_model: str = "qwen-2.5-32b"
 
-    final_section_writer_provider: str = config_yaml["final_section_writer_provider"]
-    final_section_writer_model: str = config_yaml["final_section_writer_model"]
+    search_api: str = "duckduckgo"
+    # Token budget of the source material in section writer prompts, per model
+    context_budgets: dict = field(default_factory=lambda: {"default": 6000})
+    # Jaccard similarity above which two section queries are searched once
+    query_similarity_threshold: Optional[float] = None
+    # Raw content passages kept per section after BM25 re-ranking
+    passages_per_section: int = 8
+    # Token budget of the digest of research sections given to the final section writers
+    report_digest_budget: int = 2000
+    # Serve temperature-0 model calls from the response cache, per task name
+    llm_cache: dict = field(default_factory=lambda: {"default": True})
 
-    search_api: str = config_yaml["search_api"]
+    def __post_init__(self):
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if value is not None:
+                object.__setattr__(self, f.name, coerce(value, f.type))
+
+        if self.plan_approval not in PLAN_APPROVAL_POLICIES:
+            raise ValueError(f"Unsupported plan approval: {self.plan_approval}")
+        if self.query_similarity_threshold is not None and not (
+            0 < self.query_similarity_threshold <= 1
+        ):
+            raise ValueError(
+                "query_similarity_threshold must be in (0, 1], "
+                f"got {self.query_similarity_threshold}"
+            )
+        if not 0 <= self.fast_grader_min_confidence <= 1:
+            raise ValueError(
+                "fast_grader_min_confidence must be in [0, 1], "
+                f"got {self.fast_grader_min_confidence}"
+            )
+        for name in ("number_of_queries", "passages_per_section", "report_digest_budget"):
+            if getattr(self, name) < 1:
+                raise ValueError(f"{name} must be at least 1, got {getattr(self, name)}")
+
+    def context_budget(self, model: str) -> int:
+        """Token budget of the source material for a model."""
+        return int(
+            self.context_budgets.get(model, self.context_budgets.get("default", 6000))
+        )
+
+    def llm_cache_enabled(self, task: str) -> bool:
+        """Whether a task's temperature-0 model calls use the response cache."""
+        return bool(self.llm_cache.get(task, self.llm_cache.get("default", True)))
 
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
     ) -> "Configuration":
-        """Create a Configuration instance from a RunnableConfig."""
+        """
+        Create a Configuration instance from a RunnableConfig.
+
+        Every task calls this, so instances are memoized: a configuration is
+        parsed and validated once per distinct set of configurable values,
+        environment overrides and config file contents. Instances are frozen
+        and safe to share.
+        """
         configurable = (
             config["configurable"] if config and "configurable" in config else {}
         )
-        values: dict[str, Any] = {
-            f.name: os.environ.get(f.name.upper(), configurable.get(f.name))
-            for f in fields(cls)
-            if f.init
-        }
-        return cls(**{k: v for k, v in values.items() if v})
+        names = CONFIGURATION_FIELD_NAMES
+        overrides = [configurable.get(name) for name in names]
+        environment = [os.environ.get(name.upper()) for name in names]
+        config_yaml = load_config()
+
+        key = json.dumps([overrides, environment], default=str)
+        cached = configuration_cache.get(key)
+        # A reloaded config file is a new dict, so identity tells if it changed
+        if cached is not None and cached[0] is config_yaml:
+            return cached[1]
+
+        values: dict[str, Any] = {}
+        for name, override, env_value in zip(names, overrides, environment):
+            yaml_value = config_yaml.get(YAML_KEYS.get(name, name))
+            for value in (yaml_value, override, env_value):
+                if value is not None and value != "":
+                    values[name] = value
+        configuration = cls(**values)
+
+        with configuration_cache_lock:
+            if len(configuration_cache) >= CONFIGURATION_CACHE_SIZE:
+                configuration_cache.clear()
+            configuration_cache[key] = (config_yaml, configuration)
+        return configuration
+
+
+CONFIGURATION_FIELD_NAMES = tuple(f.name for f in fields(Configuration) if f.init)
+CONFIGURATION_CACHE_SIZE = 256
+
+configuration_cache = {}
+configuration_cache_lock = threading.Lock()
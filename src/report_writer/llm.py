@@ -0,0 +1,343 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Optional
+from contextlib import asynccontextmanager
+
+from langchain.chat_models import init_chat_model
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.report_writer.telemetry import record, current_span
+from src.report_writer.cache import SearchCache
+from src.report_writer.ratelimit import AdaptiveRateLimiter, TokenRateLimiter
+from src.report_writer.utils import count_tokens_local
+
+
+class ChatModelRegistry:
+    """
+    Process-wide pool of chat model clients.
+
+    `init_chat_model` builds a new provider client (with its own HTTP
+    connection pool) on every call. The registry builds each distinct model
+    once and hands the same instance to every task and every concurrent
+    report run, so pooled connections are reused.
+
+    Models are keyed on (provider, model, temperature, structured-output
+    schema). Structured-output variants are derived from the cached base
+    model, so they share its client as well.
+    """
+
+    def __init__(self):
+        self._models = {}
+        # Key of every pooled model by its id, for the response cache
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        provider: str,
+        model: str,
+        temperature: Optional[float] = None,
+        schema: Optional[type] = None,
+    ):
+        """Return the pooled model for the key, creating it on first use."""
+        key = (provider, model, temperature, schema)
+        with self._lock:
+            cached = self._models.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+            base_key = (provider, model, temperature, None)
+            base_model = self._models.get(base_key)
+            if base_model is None:
+                kwargs = {} if temperature is None else {"temperature": temperature}
+                base_model = init_chat_model(
+                    model=model, model_provider=provider, **kwargs
+                )
+                self._models[base_key] = base_model
+                self._keys[id(base_model)] = base_key
+
+            if schema is not None:
+                self._models[key] = base_model.with_structured_output(schema)
+                self._keys[id(self._models[key])] = key
+            return self._models[key]
+
+    def key_of(self, model) -> Optional[tuple]:
+        """Return the (provider, model, temperature, schema) of a pooled model."""
+        with self._lock:
+            return self._keys.get(id(model))
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the number of pooled models."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._models),
+            }
+
+    def clear(self):
+        """Drop all pooled models and reset the counters."""
+        with self._lock:
+            self._models.clear()
+            self._keys.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+model_registry = ChatModelRegistry()
+
+
+def get_chat_model(
+    provider: str,
+    model: str,
+    temperature: Optional[float] = None,
+    schema: Optional[type] = None,
+):
+    """Get a chat model from the process-wide registry."""
+    return model_registry.get(
+        provider=provider, model=model, temperature=temperature, schema=schema
+    )
+
+
+# Providers that take explicit cache breakpoints on prompt content blocks;
+# OpenAI and Groq cache long stable prefixes without hints
+CACHE_CONTROL_PROVIDERS = {"anthropic"}
+
+
+def build_prompt(
+    provider: str, instructions: str, inputs: str, shared: Optional[str] = None
+) -> list:
+    """
+    Assemble the messages of a model call so providers can cache its prefix.
+
+    The static `instructions` come first, then `shared` context that every
+    call of a report sends unchanged (e.g. the completed sections), both in
+    the system message. The per-call `inputs` go last, in the human message.
+    For providers in CACHE_CONTROL_PROVIDERS the end of the prefix carries a
+    cache-control hint.
+    """
+    prefix = [instructions] + ([shared] if shared else [])
+    if provider in CACHE_CONTROL_PROVIDERS:
+        blocks = [{"type": "text", "text": text} for text in prefix]
+        blocks[-1]["cache_control"] = {"type": "ephemeral"}
+        system = SystemMessage(content=blocks)
+    else:
+        system = SystemMessage(content="\n\n".join(prefix))
+    return [system, HumanMessage(content=inputs)]
+
+
+def message_text(message) -> str:
+    """Text of a message, whether its content is a string or content blocks."""
+    if isinstance(message.content, str):
+        return message.content
+    return "\n\n".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in message.content
+    )
+
+
+class LLMBudget:
+    """
+    Process-wide budget of concurrent model calls and tokens per minute,
+    shared by every report run in the process.
+
+    Both limits are off by default. They are read from LLM_MAX_CONCURRENCY
+    and LLM_TOKENS_PER_MINUTE, and batch runs can `configure` them. Prompt
+    tokens are estimated locally and charged before a call; output tokens,
+    and any prompt tokens beyond the estimate, are charged after it.
+    """
+
+    def __init__(self, max_concurrency: int = None, tokens_per_minute: int = None):
+        self.configure(max_concurrency, tokens_per_minute)
+
+    def configure(self, max_concurrency: int = None, tokens_per_minute: int = None):
+        """Set the limits; `None` removes a limit. Calls in flight keep theirs."""
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.limiter = (
+            AdaptiveRateLimiter("llm", max_concurrency) if max_concurrency else None
+        )
+        self.tokens = TokenRateLimiter(tokens_per_minute) if tokens_per_minute else None
+
+    @asynccontextmanager
+    async def reserve(self, messages: list):
+        """Hold a call slot and the estimated prompt tokens for a model call.
+
+        Yields a function to call with the response's usage metadata.
+        """
+        limiter, tokens = self.limiter, self.tokens
+        estimate = 0
+        if tokens is not None:
+            estimate = sum(count_tokens_local(message_text(message)) for message in messages)
+            await tokens.acquire(estimate)
+        if limiter is not None:
+            await limiter.acquire()
+
+        def charge(usage):
+            if tokens is not None and usage:
+                tokens.add(
+                    usage.get("output_tokens", 0)
+                    + max(0, usage.get("input_tokens", 0) - estimate)
+                )
+
+        try:
+            yield charge
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+    def stats(self) -> dict:
+        """Return the limits and the state of the call and token limiters."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "tokens_per_minute": self.tokens_per_minute,
+            "calls": self.limiter.stats() if self.limiter else None,
+            "tokens": self.tokens.stats() if self.tokens else None,
+        }
+
+
+llm_budget = LLMBudget(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 0)) or None,
+    tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", 0)) or None,
+)
+
+
+def message_digest(messages: list) -> str:
+    """
+    Hash the role and content of every message. Surrounding whitespace and
+    trailing spaces on each line are ignored, so prompts differing only in
+    template indentation share a digest.
+    """
+    normalized = []
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            content = "\n".join(line.rstrip() for line in content.strip().splitlines())
+        normalized.append([message.type, content])
+    payload = json.dumps(normalized, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache(SearchCache):
+    """
+    Persistent cache of deterministic (temperature 0) model responses,
+    backed by SQLite like the search cache.
+
+    Entries are keyed on the provider, the model, the structured-output
+    schema and the digest of the messages. They expire after `ttl_seconds`,
+    and the least recently used entries are evicted once the cache holds
+    more than `max_entries`. Concurrent identical calls share one model call.
+
+    Args:
+        path: Location of the SQLite database file
+        ttl_seconds: Lifetime of an entry, 0 disables the cache
+        max_entries: Maximum number of entries kept on disk
+    """
+
+    table = "llm_cache"
+    hits_counter = "llm_cache_hits"
+
+    def should_cache(self, value) -> bool:
+        """Whether to store a response; empty responses are not."""
+        return bool(value.get("structured") or value.get("content"))
+
+    @staticmethod
+    def dump(response, schema: Optional[type]) -> dict:
+        """Serialize a structured output or chat message for the cache."""
+        if schema is not None:
+            return {"structured": response.model_dump()}
+        return {"content": response.content}
+
+    @staticmethod
+    def load(value: dict, schema: Optional[type]):
+        """Rebuild the structured output or chat message of a cached response."""
+        if schema is not None:
+            return schema.model_validate(value["structured"])
+        return AIMessage(content=value["content"])
+
+
+llm_cache = LLMCache(
+    path=os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite"),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 60 * 60)),
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10_000)),
+)
+
+
+async def call_model(model, messages: list, on_chunk=None):
+    """Invoke a chat model within the `llm_budget` and record its usage."""
+    async with llm_budget.reserve(messages) as charge:
+        if on_chunk is None:
+            response = await model.ainvoke(messages)
+        else:
+            response = None
+            async for chunk in model.astream(messages):
+                response = chunk if response is None else response + chunk
+                if chunk.content:
+                    on_chunk(chunk.content)
+        usage = getattr(response, "usage_metadata", None)
+        charge(usage)
+
+    record("llm_calls")
+    if usage:
+        record("input_tokens", usage.get("input_tokens", 0))
+        record("output_tokens", usage.get("output_tokens", 0))
+        # Prompt tokens the provider served from its prefix cache
+        cached = (usage.get("input_token_details") or {}).get("cache_read")
+        if cached:
+            record("cached_input_tokens", cached)
+    elif current_span.get() is not None:
+        record(
+            "input_tokens_estimated",
+            sum(count_tokens_local(message_text(message)) for message in messages),
+        )
+    return response
+
+
+async def ainvoke_model(model, messages: list, on_chunk=None, cache: bool = True):
+    """
+    Invoke a chat model and record the call and its token usage on the
+    current tracing span.
+
+    With `on_chunk`, the response is streamed and `on_chunk(text)` is called
+    with every token chunk as it arrives; the assembled message is returned
+    either way.
+
+    Calls are held to the process-wide `llm_budget`. Providers report usage
+    on plain chat responses; for structured outputs the prompt tokens are
+    estimated locally, and only while a span is collecting counters.
+
+    Responses of registry models at temperature 0 are served from `llm_cache`
+    unless `cache` is False. A cache hit makes no model call, takes no budget
+    and records `llm_cache_hits` instead of `llm_calls`; a streamed hit is
+    passed to `on_chunk` in one chunk.
+    """
+    key = model_registry.key_of(model) if cache and llm_cache.enabled else None
+    if key is None or key[2] != 0:
+        return await call_model(model, messages, on_chunk)
+
+    provider, model_name, _, schema = key
+    responses = []
+
+    async def fetch():
+        response = await call_model(model, messages, on_chunk)
+        responses.append(response)
+        return LLMCache.dump(response, schema)
+
+    value = await llm_cache.get_or_fetch(
+        provider,
+        model_name,
+        fetch,
+        schema=schema.__name__ if schema is not None else None,
+        messages=message_digest(messages),
+    )
+    if responses:
+        return responses[0]
+    if on_chunk is not None and value.get("content"):
+        on_chunk(value["content"])
+    return LLMCache.load(value, schema)
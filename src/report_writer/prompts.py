@@ -52,6 +52,37 @@ Incorporate this feedback (if provided):
 </Feedback>  
 """
 
+# Instructions for report plan grading
+report_plan_grader_instructions = """Review a report plan relative to the specified topic:
+
+<Report Topic>
+{topic}
+</Report Topic>
+
+<Report Structure>
+{report_structure}
+</Report Structure>
+
+<Report Plan>
+{sections}
+</Report Plan>
+
+<Task>
+Evaluate whether the plan covers the topic without overlapping sections and follows the report structure, and whether web research is requested exactly for the sections that need it.
+
+If the plan fails any criteria, give specific feedback on how to change it.
+</Task>
+
+<format>
+    grade: Literal["pass","fail"] = Field(
+        description="Evaluation result indicating whether the plan meets requirements ('pass') or needs revision ('fail')."
+    )
+    feedback: str = Field(
+        description="Specific changes to the plan if it fails, otherwise empty.",
+    )
+</format>
+"""
+
 # Query writer instructions
 section_query_writer_instructions = """You are an expert technical writer generating precise web search queries to gather comprehensive information for a technical report section.
 
@@ -67,17 +98,11 @@ Generate {number_of_queries} search query/queries to collect in-depth informatio
 Ensure the queries are specific enough to retrieve high-quality, relevant sources.
 </Task>
 """
-# Section writer instructions
+# Section writer instructions. Static, so providers can cache them as a
+# prompt prefix; the per-section inputs follow in section_writer_inputs
 section_writer_instructions = """You are an expert technical writer crafting a section of a technical report.
 
-## Section Topic  
-{section_topic}  
-
-## Existing Content (if any)  
-{section_content}  
-
-## Source Material  
-{context}  
+You are given the section topic, its existing content (if any) and source material.
 
 ## Writing Instructions  
 - If no content exists, write from scratch.  
@@ -100,16 +125,19 @@ section_writer_instructions = """You are an expert technical writer crafting a s
 - Sources cited at the end in this format:  
   - `- Title: URL`
 """
-# Instructions for section grading
-section_grader_instructions = """Review a report section relative to the specified topic:
+section_writer_inputs = """## Section Topic  
+{section_topic}  
 
-<section topic>
-{section_topic}
-</section topic>
+## Existing Content (if any)  
+{section_content}  
 
-<section content>
-{section}
-</section content>
+## Source Material  
+{context}  
+
+Generate a report section based on the provided sources.
+"""
+# Instructions for section grading; the section follows in section_grader_inputs
+section_grader_instructions = """Review a report section relative to the specified topic.
 
 <task>
 Evaluate whether the section adequately covers the topic by checking technical accuracy and depth.
@@ -126,15 +154,19 @@ If the section fails any criteria, generate specific follow-up search queries to
     )
 </format>
 """
-final_section_writer_instructions = """You are an expert technical writer synthesizing information into a report section.
+section_grader_inputs = """<section topic>
+{section_topic}
+</section topic>
 
-<Section topic>  
-{section_topic}  
-</Section topic>
+<section content>
+{section}
+</section content>
 
-<Available report content>  
-{context}  
-</Available report content>
+Grade the report and consider follow-up questions for missing information:
+"""
+# Final section writer instructions; the completed sections shared by every
+# final section follow in final_section_writer_context, then the section
+final_section_writer_instructions = """You are an expert technical writer synthesizing information into a report section.
 
 <Task>  
 1. **Section Guidelines:**  
@@ -166,3 +198,13 @@ final_section_writer_instructions = """You are an expert technical writer synthe
 - No preamble, word count, or extra instructions in response.  
 </Quality Checks>
 """
+final_section_writer_context = """<Available report content>  
+{context}  
+</Available report content>
+"""
+final_section_writer_inputs = """<Section topic>  
+{section_topic}  
+</Section topic>
+
+Generate a report section based on the provided sources.
+"""
@@ -0,0 +1,162 @@
+import re
+from collections import Counter
+from typing import TYPE_CHECKING
+
+# numpy is imported by the functions using it, keeping it off the startup path
+if TYPE_CHECKING:
+    import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Very common English words that carry no relevance signal
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "their this to was were which with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens without stopwords."""
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def chunk_text(text: str, chunk_words: int = 120, overlap: int = 20) -> list[str]:
+    """
+    Split a text into overlapping chunks of roughly `chunk_words` words.
+
+    Args:
+        text: Text to split
+        chunk_words: Number of words per chunk
+        overlap: Number of words shared by consecutive chunks
+
+    Returns:
+        List[str]: The chunks, in document order
+    """
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    return [
+        " ".join(words[start : start + chunk_words])
+        for start in range(0, max(1, len(words) - overlap), step)
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 index of passages, tokenized once and scored against any
+    number of queries.
+
+    The term-frequency matrix of a query only spans the query terms, so
+    scoring all passages is a handful of vectorized NumPy operations.
+    """
+
+    def __init__(self, passages: list[str], k1: float = 1.5, b: float = 0.75):
+        import numpy as np
+
+        self.k1 = k1
+        self.b = b
+        passage_tokens = [tokenize(passage) for passage in passages]
+        self.counts = [Counter(tokens) for tokens in passage_tokens]
+        self.lengths = np.array(
+            [len(tokens) for tokens in passage_tokens], dtype=float
+        )
+        self.avg_length = (self.lengths.mean() if passages else 0.0) or 1.0
+
+    def scores(self, query: str) -> "np.ndarray":
+        """
+        Score every passage against the query.
+
+        Returns:
+            np.ndarray: One score per passage
+        """
+        import numpy as np
+
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not self.counts or not query_terms:
+            return np.zeros(len(self.counts))
+
+        tf = np.array(
+            [[count.get(term, 0) for term in query_terms] for count in self.counts],
+            dtype=float,
+        )
+        n_passages = len(self.counts)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log((n_passages - df + 0.5) / (df + 0.5) + 1.0)
+
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / self.avg_length)
+        return (idf * tf * (self.k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+
+def bm25_scores(
+    query: str, passages: list[str], k1: float = 1.5, b: float = 0.75
+) -> "np.ndarray":
+    """
+    Score passages against a query with Okapi BM25.
+
+    Returns:
+        np.ndarray: One score per passage
+    """
+    return BM25Index(passages, k1=k1, b=b).scores(query)
+
+
+def select_passages(
+    query: str,
+    sources: list[dict],
+    top_k: int = 8,
+    chunk_words: int = 120,
+    min_per_source: int = 1,
+):
+    """
+    Replace the raw_content of each source with its passages most relevant
+    to the query.
+
+    Every source's raw_content is chunked, all chunks are ranked together
+    with BM25, and the `top_k` best are kept. Each source with raw content
+    also keeps its `min_per_source` best chunks so no source drops out of
+    the context entirely. Kept chunks stay in document order.
+
+    Args:
+        query: Text to rank against, e.g. the section description
+        sources: Deduplicated search result dicts
+        top_k: Number of passages kept across all sources
+        chunk_words: Number of words per chunk
+        min_per_source: Passages always kept for each source
+
+    Returns:
+        List[dict]: Copies of the sources with the selected passages as
+            raw_content
+    """
+    import numpy as np
+
+    chunks = []
+    owners = []
+    for index, source in enumerate(sources):
+        source_chunks = chunk_text(source.get("raw_content") or "", chunk_words)
+        chunks.extend(source_chunks)
+        owners.extend([index] * len(source_chunks))
+
+    if not chunks:
+        return sources
+
+    scores = bm25_scores(query, chunks)
+    owners = np.array(owners)
+    keep = set(np.argsort(-scores, kind="stable")[:top_k].tolist())
+    for index in range(len(sources)):
+        source_chunk_ids = np.flatnonzero(owners == index)
+        if source_chunk_ids.size:
+            best = source_chunk_ids[np.argsort(-scores[source_chunk_ids], kind="stable")]
+            keep.update(best[:min_per_source].tolist())
+
+    selected = [[] for _ in sources]
+    for chunk_id in sorted(keep):
+        selected[owners[chunk_id]].append(chunks[chunk_id])
+
+    return [
+        {**source, "raw_content": "\n...\n".join(passages)} if passages else source
+        for source, passages in zip(sources, selected)
+    ]
@@ -0,0 +1,258 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+from src.report_writer.telemetry import record
+
+
+class AdaptiveRateLimiter:
+    """
+    AIMD concurrency limiter with jittered retries for a search provider.
+
+    The number of requests allowed in flight grows additively after fast,
+    successful calls and is cut multiplicatively when the provider returns a
+    rate-limit or server error, or when a call is slower than
+    `target_latency`. Retryable errors are retried with full-jitter
+    exponential backoff. One limiter per provider is shared by every
+    workflow run in the process, whatever event loop it runs on.
+
+    Args:
+        name: Provider name, used in error messages
+        max_concurrency: Ceiling on concurrent requests
+        min_concurrency: Floor on concurrent requests
+        initial_concurrency: Starting limit, defaults to `max_concurrency`
+        target_latency: Latency in seconds above which the limit shrinks
+        max_retries: Retries for a retryable error before giving up
+        backoff_base: Base delay in seconds of the exponential backoff
+        backoff_max: Cap in seconds on a single backoff delay
+    """
+
+    RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+    RETRYABLE_MESSAGES = ("rate limit", "ratelimit", "too many requests", "429", "timed out", "timeout")
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        initial_concurrency: int = None,
+        target_latency: float = None,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(initial_concurrency or max_concurrency)
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.active = 0
+        self.successes = 0
+        self.errors = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()
+
+    def _release_waiters(self):
+        # Hand free slots to waiters in FIFO order; caller holds the lock
+        while self._waiters and self.active < int(self.limit):
+            loop, waiter = self._waiters.popleft()
+            self.active += 1
+            loop.call_soon_threadsafe(self._wake, waiter)
+
+    def _wake(self, waiter):
+        if waiter.cancelled():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+    async def acquire(self):
+        """Wait for a free request slot."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self.active < int(self.limit):
+                self.active += 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = (loop, waiter) not in self._waiters
+                if not granted:
+                    self._waiters.remove((loop, waiter))
+            # A slot handed over just before the cancellation must go back
+            if granted and waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """Give a request slot back."""
+        with self._lock:
+            self.active -= 1
+            self._release_waiters()
+
+    def set_max_concurrency(self, max_concurrency: int):
+        """Change the concurrency ceiling, e.g. for the budget of a batch run."""
+        with self._lock:
+            self.max_concurrency = max_concurrency
+            self.limit = min(float(max_concurrency), max(self.limit, self.min_concurrency))
+            self._release_waiters()
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.successes += 1
+            if self.target_latency and latency > self.target_latency:
+                self.limit = max(self.min_concurrency, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._release_waiters()
+
+    def record_error(self, retryable: bool):
+        with self._lock:
+            self.errors += 1
+            if retryable:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+
+    @classmethod
+    def is_retryable(cls, error: Exception) -> bool:
+        """Whether the error looks like a rate limit, timeout or server error."""
+        status_code = getattr(error, "status_code", None) or getattr(
+            getattr(error, "response", None), "status_code", None
+        )
+        if status_code in cls.RETRYABLE_STATUS_CODES:
+            return True
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+            return True
+        message = str(error).lower()
+        return any(pattern in message for pattern in cls.RETRYABLE_MESSAGES)
+
+    async def run(self, fn):
+        """Run `await fn()` under the limiter, retrying retryable errors."""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire()
+            record("search_calls")
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                retryable = self.is_retryable(e)
+                self.record_error(retryable)
+                if not retryable or attempt == self.max_retries:
+                    raise
+            else:
+                self.record_success(time.monotonic() - start)
+                return result
+            finally:
+                self.release()
+
+            self.retries += 1
+            delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+
+    def stats(self) -> dict:
+        """Return the current limit and call counters."""
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "active": self.active,
+                "waiting": len(self._waiters),
+                "successes": self.successes,
+                "errors": self.errors,
+                "retries": self.retries,
+            }
+
+
+class TokenRateLimiter:
+    """
+    Tokens-per-minute budget over a sliding window, shared by every workflow
+    run in the process whatever event loop it runs on.
+
+    `acquire` waits until the tokens fit in the budget of the last
+    `window` seconds; a single request larger than the budget is let through
+    once the window is empty. `add` charges tokens known only afterwards,
+    e.g. the output tokens of a model call, without waiting.
+
+    Args:
+        tokens_per_minute: Tokens allowed per window
+        window: Window length in seconds
+    """
+
+    def __init__(self, tokens_per_minute: int, window: float = 60.0):
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self.used = 0
+        self.waits = 0
+        self._usage = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        # Drop usage older than the window; caller holds the lock
+        while self._usage and self._usage[0][0] <= now - self.window:
+            self.used -= self._usage.popleft()[1]
+
+    async def acquire(self, tokens: int):
+        """Wait until `tokens` fit in the budget, then charge them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                if not self._usage or self.used + tokens <= self.tokens_per_minute:
+                    self._usage.append((now, tokens))
+                    self.used += tokens
+                    return
+                self.waits += 1
+                delay = self._usage[0][0] + self.window - now
+            await asyncio.sleep(delay)
+
+    def add(self, tokens: int):
+        """Charge tokens without waiting."""
+        with self._lock:
+            self._usage.append((time.monotonic(), tokens))
+            self.used += tokens
+
+    def stats(self) -> dict:
+        """Return the tokens used in the current window and the number of waits."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "tokens_per_minute": self.tokens_per_minute,
+                "used": self.used,
+                "waits": self.waits,
+            }
+
+
+# Default concurrency ceilings, overridable with <PROVIDER>_MAX_CONCURRENCY
+DEFAULT_MAX_CONCURRENCY = {"tavily": 10, "duckduckgo": 3}
+
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> AdaptiveRateLimiter:
+    """Get the process-wide rate limiter of a search provider."""
+    with rate_limiters_lock:
+        limiter = rate_limiters.get(provider)
+        if limiter is None:
+            env_prefix = provider.upper()
+            target_latency = os.getenv(f"{env_prefix}_TARGET_LATENCY")
+            limiter = AdaptiveRateLimiter(
+                name=provider,
+                max_concurrency=int(
+                    os.getenv(
+                        f"{env_prefix}_MAX_CONCURRENCY",
+                        DEFAULT_MAX_CONCURRENCY.get(provider, 5),
+                    )
+                ),
+                target_latency=float(target_latency) if target_latency else None,
+                max_retries=int(os.getenv(f"{env_prefix}_MAX_RETRIES", 3)),
+            )
+            rate_limiters[provider] = limiter
+        return limiter
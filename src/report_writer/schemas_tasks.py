@@ -1,4 +1,4 @@
-from typing import Annotated, List, TypedDict, Literal
+from typing import Annotated, List, TypedDict, Literal, Optional
 from pydantic import BaseModel, Field
 import operator
 
@@ -6,12 +6,26 @@ import operator
 class ReportPlanInput(TypedDict):
     topic: str  # Report topic
     feedback_on_report_plan: str  # Feedback on the report plan
+    planner_context: str  # Formatted web search results to plan the sections with
 
 
 class SearchQuery(BaseModel):
     search_query: str = Field(None, description="Query for web search.")
 
 
+class SearchResult(TypedDict):
+    title: str  # Title of the page
+    url: str  # URL of the page, identifies the source across queries
+    content: str  # Snippet or most relevant content of the page
+    score: Optional[float]  # Relevance score, None if the provider has none
+    raw_content: Optional[str]  # Full page content, None if not available
+
+
+class SearchResponse(TypedDict):
+    query: str  # The search query
+    results: list[SearchResult]  # Results in provider order
+
+
 class Queries(BaseModel):
     queries: List[SearchQuery] = Field(
         description="List of search queries.",
@@ -66,7 +80,8 @@ class SectionWebSearchInput(TypedDict):
 
 class WriteSectionInput(TypedDict):
     section: Section  # Report section
-    source_str: str  # String of formatted source content from web search
+    source_ids: list[str]  # IDs of the section's sources in the report's SourceStore
+    search_queries: list[SearchQuery]  # Queries already searched for the section
     search_iterations: int
 
 
@@ -79,6 +94,21 @@ class SectionGraderOutput(BaseModel):
     )
 
 
+class FastSectionGraderOutput(SectionGraderOutput):
+    confidence: float = Field(
+        description="Confidence in the grade, from 0 (a guess) to 1 (certain)."
+    )
+
+
+class PlanGraderOutput(BaseModel):
+    grade: Literal["pass", "fail"] = Field(
+        description="Does the report plan meet requirements ('pass') or need revision ('fail')?"
+    )
+    feedback: str = Field(
+        description="Specific changes to the plan if it fails, otherwise empty.",
+    )
+
+
 class RouterGraderDecisonInput(TypedDict):
     feedback: SectionGraderOutput
     section: Section  # Report section
@@ -87,7 +117,7 @@ class RouterGraderDecisonInput(TypedDict):
 
 class FinalSectionWriterInput(TypedDict):
     section: Section  # Report section
-    completed_sections: str  # String of formatted source content from web search
+    report_digest: str  # Compact digest of the completed research sections
 
 
 class FinalReportInput(TypedDict):
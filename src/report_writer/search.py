@@ -0,0 +1,379 @@
+import os
+import json
+import asyncio
+import threading
+from pathlib import Path
+from typing import Optional
+
+from src.report_writer.cache import SearchCache
+from src.report_writer.ratelimit import get_rate_limiter, rate_limiters
+from src.report_writer.schemas_tasks import SearchResponse, SearchResult
+from src.report_writer.sources import deduplicate_and_format_sources
+from src.report_writer.telemetry import record
+from src.report_writer.utils import duckduckgo_search_async, tavily_search_async
+
+
+def normalize_result(result: dict) -> SearchResult:
+    """Map a provider result onto the fields every provider returns."""
+    return {
+        "title": result.get("title") or result.get("url", ""),
+        "url": result["url"],
+        "content": result.get("content") or "",
+        "score": result.get("score"),
+        "raw_content": result.get("raw_content"),
+    }
+
+
+def normalize_response(query: str, results: list[dict]) -> SearchResponse:
+    return {"query": query, "results": [normalize_result(r) for r in results]}
+
+
+class SearchProvider:
+    """
+    Interface of a search backend.
+
+    `search` returns one normalized `SearchResponse` per query, in query
+    order, whatever the backend returns natively. The class attributes
+    describe what the backend can do, e.g. whether results carry the full
+    page content that section writers re-rank passages from, and whether
+    it runs its queries under its own rate limiter.
+    """
+
+    name = "base"
+    supports_raw_content = False
+    supports_scores = False
+    rate_limited = False
+
+    async def search(self, queries: list[str]) -> list[SearchResponse]:
+        raise NotImplementedError
+
+    def format_sources(self, responses: list[SearchResponse]) -> str:
+        """Format deduplicated sources for a prompt (snippets only)."""
+        return deduplicate_and_format_sources(
+            responses, max_tokens_per_source=600, include_raw_content=False
+        )
+
+
+class TavilySearchProvider(SearchProvider):
+    """Tavily search API, cached and rate limited, with full page content."""
+
+    name = "tavily"
+    supports_raw_content = True
+    supports_scores = True
+    rate_limited = True
+
+    async def search(self, queries: list[str]) -> list[SearchResponse]:
+        responses = await tavily_search_async(queries)
+        return [
+            normalize_response(response["query"], response["results"])
+            for response in responses
+        ]
+
+
+class DuckDuckGoSearchProvider(SearchProvider):
+    """DuckDuckGo text search, cached and rate limited, snippets only."""
+
+    name = "duckduckgo"
+    rate_limited = True
+
+    async def search(self, queries: list[str]) -> list[SearchResponse]:
+        responses = await duckduckgo_search_async(queries)
+        return [
+            normalize_response(response["query"], response["results"])
+            for response in responses
+        ]
+
+
+class LocalSearchProvider(SearchProvider):
+    """
+    Offline provider answering from an on-disk corpus and recorded fixtures,
+    for load tests and benchmarks of the full workflow without network.
+
+    A query found in the fixtures (compared after normalization) replays the
+    recorded response; any other query is answered with the documents of
+    the corpus that score best against it with BM25. Every query takes
+    `latency` seconds, so runs are deterministic. Files are read on the
+    first search.
+
+    Args:
+        corpus_path: Directory of `.txt`/`.md` documents (the first line is
+            the title), or a JSON lines file of documents with `title`,
+            `url` and `content`
+        fixtures_path: JSON lines file of recorded `SearchResponse`s
+        latency: Seconds per query, or a function of the query returning them
+        max_results: Corpus documents returned per query
+        documents: Documents given directly instead of a corpus path
+    """
+
+    name = "local"
+    supports_raw_content = True
+    supports_scores = True
+
+    SNIPPET_CHARS = 500
+
+    def __init__(
+        self,
+        corpus_path: Optional[str] = None,
+        fixtures_path: Optional[str] = None,
+        latency=0.0,
+        max_results: int = 5,
+        documents: Optional[list[dict]] = None,
+    ):
+        self.corpus_path = corpus_path
+        self.fixtures_path = fixtures_path
+        self.latency = latency
+        self.max_results = max_results
+        self._documents = documents
+        self._fixtures = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._fixtures is not None:
+                return
+            fixtures = {}
+            if self.fixtures_path:
+                for response in read_json_lines(self.fixtures_path):
+                    fixtures[SearchCache.normalize_query(response["query"])] = response
+            documents = self._documents
+            if documents is None:
+                documents = read_corpus(self.corpus_path) if self.corpus_path else []
+            if documents:
+                from src.report_writer.ranking import BM25Index
+
+                self._index = BM25Index(
+                    [f"{doc['title']}\n{doc['content']}" for doc in documents]
+                )
+            self._documents = documents
+            self._fixtures = fixtures
+
+    def _answer(self, query: str) -> SearchResponse:
+        recorded = self._fixtures.get(SearchCache.normalize_query(query))
+        if recorded is not None:
+            return normalize_response(query, recorded["results"])
+        if self._index is None:
+            return {"query": query, "results": []}
+
+        scores = self._index.scores(query)
+        ranked = sorted(
+            (index for index in range(len(scores)) if scores[index] > 0),
+            key=lambda index: -scores[index],
+        )[: self.max_results]
+        return normalize_response(
+            query,
+            [
+                {
+                    "title": self._documents[index]["title"],
+                    "url": self._documents[index]["url"],
+                    "content": self._documents[index]["content"][: self.SNIPPET_CHARS],
+                    "score": float(scores[index]),
+                    "raw_content": self._documents[index]["content"],
+                }
+                for index in ranked
+            ],
+        )
+
+    async def search(self, queries: list[str]) -> list[SearchResponse]:
+        self._load()
+
+        async def search_one(query):
+            record("search_calls")
+            delay = self.latency(query) if callable(self.latency) else self.latency
+            if delay:
+                await asyncio.sleep(delay)
+            return self._answer(query)
+
+        return list(await asyncio.gather(*(search_one(query) for query in queries)))
+
+
+def configured_rate_limiter(name: str):
+    """
+    Get the rate limiter of a provider without its own, or None.
+
+    These providers are not limited unless a ceiling is configured, with
+    `<NAME>_MAX_CONCURRENCY` or by a batch run's search budget.
+    """
+    if name in rate_limiters or os.getenv(f"{name.upper()}_MAX_CONCURRENCY"):
+        return get_rate_limiter(name)
+    return None
+
+
+class RateLimitedSearchProvider(SearchProvider):
+    """Runs each query of a provider under the rate limiter of its registered name."""
+
+    def __init__(self, provider: SearchProvider, limiter_name: str):
+        self.provider = provider
+        self.limiter_name = limiter_name
+        self.name = provider.name
+        self.supports_raw_content = provider.supports_raw_content
+        self.supports_scores = provider.supports_scores
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    async def search(self, queries: list[str]) -> list[SearchResponse]:
+        limiter = configured_rate_limiter(self.limiter_name)
+        if limiter is None:
+            return await self.provider.search(queries)
+
+        async def search_one(query):
+            await limiter.acquire()
+            try:
+                return (await self.provider.search([query]))[0]
+            finally:
+                limiter.release()
+
+        return list(await asyncio.gather(*(search_one(query) for query in queries)))
+
+    def format_sources(self, responses: list[SearchResponse]) -> str:
+        return self.provider.format_sources(responses)
+
+
+def read_json_lines(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def read_corpus(path: str) -> list[dict]:
+    """Read corpus documents from a directory of text files or a JSON lines file."""
+    corpus = Path(path)
+    if corpus.is_file():
+        return read_json_lines(path)
+
+    documents = []
+    for file in sorted(corpus.rglob("*")):
+        if file.suffix not in (".txt", ".md") or not file.is_file():
+            continue
+        text = file.read_text(encoding="utf-8")
+        title, _, content = text.partition("\n")
+        documents.append(
+            {
+                "title": title.lstrip("# ").strip() or file.stem,
+                "url": file.resolve().as_uri(),
+                "content": content.strip() or title,
+            }
+        )
+    return documents
+
+
+def make_local_search_provider() -> LocalSearchProvider:
+    """Local provider configured with the LOCAL_SEARCH_* environment variables."""
+    return LocalSearchProvider(
+        corpus_path=os.getenv("LOCAL_SEARCH_CORPUS"),
+        fixtures_path=os.getenv("LOCAL_SEARCH_FIXTURES"),
+        latency=float(os.getenv("LOCAL_SEARCH_LATENCY", 0.0)),
+        max_results=int(os.getenv("LOCAL_SEARCH_MAX_RESULTS", 5)),
+    )
+
+
+search_provider_factories = {
+    "tavily": TavilySearchProvider,
+    "duckduckgo": DuckDuckGoSearchProvider,
+    "local": make_local_search_provider,
+}
+
+search_providers = {}
+search_providers_lock = threading.Lock()
+
+
+def register_search_provider(name: str, factory):
+    """Register a factory building a search provider, selected with `search_api: <name>`."""
+    with search_providers_lock:
+        search_provider_factories[name] = factory
+        search_providers.pop(name, None)
+
+
+def get_search_provider(name: str) -> SearchProvider:
+    """Get the process-wide search provider registered under `name`."""
+    with search_providers_lock:
+        provider = search_providers.get(name)
+        if provider is None:
+            if name not in search_provider_factories:
+                raise ValueError(f"Unsupported search API: {name}")
+            provider = search_provider_factories[name]()
+            if not provider.rate_limited:
+                provider = RateLimitedSearchProvider(provider, name)
+            search_providers[name] = provider
+        return provider
+
+
+class SearchBatcher:
+    """
+    Deduplicates search queries across the sections of a report as they
+    arrive, without waiting for every section to have its queries.
+
+    Each distinct query runs once; sections asking for the same query, or
+    for a near-duplicate of it, await the same provider call. Queries are
+    compared after normalization, and when `similarity_threshold` is set a
+    query whose word-set Jaccard similarity with an earlier one reaches the
+    threshold shares its results. All calls go through the provider's
+    process-wide rate limiter, so they share one concurrency budget.
+
+    Args:
+        similarity_threshold (float|None): Near-duplicate threshold in (0, 1]
+    """
+
+    def __init__(self, similarity_threshold=None):
+        self.similarity_threshold = similarity_threshold
+        self.requested = 0
+        self._searches = {}
+        self._tokens = {}
+
+    def _match(self, provider: str, key: str):
+        if (provider, key) in self._searches:
+            return (provider, key)
+        if self.similarity_threshold:
+            tokens = set(key.split())
+            for (other_provider, other_key), other in self._tokens.items():
+                union = tokens | other
+                if (
+                    other_provider == provider
+                    and union
+                    and len(tokens & other) / len(union) >= self.similarity_threshold
+                ):
+                    return (other_provider, other_key)
+        return None
+
+    async def search(self, search_queries, search_provider):
+        """
+        Search the queries with `search_provider`, reusing in-flight or
+        finished searches of earlier identical or near-identical queries.
+
+        Args:
+            search_queries (List[str]): Queries of one section
+            search_provider: `SearchProvider` with a `name` and async `search`
+
+        Returns:
+            List[dict]: One search response per distinct query
+        """
+        provider = search_provider.name
+        searches = []
+        for query in search_queries:
+            self.requested += 1
+            key = SearchCache.normalize_query(query)
+            match = self._match(provider, key)
+            if match is None:
+                match = (provider, key)
+                self._searches[match] = asyncio.ensure_future(
+                    self._search_one(search_provider, query)
+                )
+                self._tokens[match] = set(key.split())
+            if self._searches[match] not in searches:
+                searches.append(self._searches[match])
+
+        # Shield the shared searches so one cancelled section does not cancel them for the others
+        return list(await asyncio.gather(*(asyncio.shield(s) for s in searches)))
+
+    @staticmethod
+    async def _search_one(search_provider, query):
+        return (await search_provider.search([query]))[0]
+
+    def stats(self) -> dict:
+        """Return counts of requested, unique and saved provider calls."""
+        unique = len(self._searches)
+        return {
+            "requested": self.requested,
+            "unique": unique,
+            "saved": self.requested - unique,
+        }
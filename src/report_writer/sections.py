@@ -0,0 +1,218 @@
+import re
+
+from src.report_writer.schemas_tasks import Section
+from src.report_writer.utils import count_tokens_local
+
+
+# Lines of section content left out of the report digest: Markdown titles
+# (the digest has its own headers) and source citations
+DIGEST_SKIPPED_LINE = re.compile(
+    r"^(#+\s|[-*]?\s*\S.*https?://\S+\s*$|\**sources\**:?$)", re.IGNORECASE
+)
+
+
+def digest_lines(section: Section) -> list[str]:
+    """Content lines of a section worth keeping in a digest, whitespace collapsed."""
+    lines = []
+    for line in (section.content or "").splitlines():
+        line = " ".join(line.split())
+        if line and not DIGEST_SKIPPED_LINE.match(line):
+            lines.append(line)
+    return lines
+
+
+def truncate_words(text: str, budget_tokens: int, token_counter=count_tokens_local) -> str:
+    """Cut text at a word boundary so it fits within a token budget."""
+    tokens = token_counter(text)
+    if tokens <= budget_tokens:
+        return text
+    words = text.split()
+    # Start from a proportional cut and drop words until the text fits
+    keep = int(len(words) * budget_tokens / tokens)
+    while keep > 0:
+        truncated = " ".join(words[:keep]) + " ..."
+        if token_counter(truncated) <= budget_tokens:
+            return truncated
+        keep -= 1
+    return ""
+
+
+def report_digest(
+    sections: list[Section], budget_tokens: int, token_counter=count_tokens_local
+) -> str:
+    """
+    Build a compact digest of completed sections within a token budget.
+
+    Each section gets a one-line header with its number, name and
+    description, followed by its content without titles, source citations
+    and indentation. The budget left after the headers and line breaks is
+    shared between the sections: short sections are kept whole and the
+    remainder is split evenly among the longer ones, whose content is cut at
+    a line, or at a word within the last line that does not fit. When the
+    headers alone do not fit, they are cut to an equal share of the budget
+    and sections whose header does not fit at all are left out.
+
+    Args:
+        sections: Completed sections, in report order
+        budget_tokens: Token budget of the whole digest
+        token_counter: Function counting the tokens of a string
+
+    Returns:
+        str: The digest, one block per section
+    """
+    line_break = token_counter("\n")
+    block_break = token_counter("\n\n")
+    headers = [
+        f"[{section.section_number}] {section.name}: {section.description}"
+        for section in sections
+    ]
+    bodies = [digest_lines(section) for section in sections]
+
+    # Too many sections for their headers: cut the headers to an even share
+    remaining = budget_tokens - block_break * max(0, len(sections) - 1)
+    header_tokens = [token_counter(header) for header in headers]
+    if sections and sum(header_tokens) > remaining:
+        share = max(0, remaining) // len(sections)
+        blocks = [truncate_words(header, share, token_counter) for header in headers]
+        return "\n\n".join(block for block in blocks if block)
+    remaining -= sum(header_tokens)
+
+    # Share the budget out from the shortest section to the longest; each
+    # line costs its tokens and its line break
+    sizes = [
+        sum(token_counter(line) + line_break for line in body) for body in bodies
+    ]
+    shares = [0] * len(sections)
+    order = sorted(range(len(sections)), key=lambda index: sizes[index])
+    for position, index in enumerate(order):
+        shares[index] = max(0, min(sizes[index], remaining // (len(order) - position)))
+        remaining -= shares[index]
+
+    blocks = []
+    for header, body, share in zip(headers, bodies, shares):
+        kept = []
+        for line in body:
+            line_tokens = token_counter(line) + line_break
+            if line_tokens > share:
+                line = truncate_words(line, share - line_break, token_counter)
+                if line:
+                    kept.append(line)
+                break
+            kept.append(line)
+            share -= line_tokens
+        blocks.append("\n".join([header] + kept))
+    return "\n\n".join(blocks)
+
+
+# Words of a section description that are not key terms
+DESCRIPTION_STOPWORDS = frozenset(
+    "about also and are between both does each from have how into its more most "
+    "other over such than that the their them then these they this those through "
+    "under what when where which while with within without".split()
+)
+
+
+def key_terms(text: str) -> set[str]:
+    """Lowercase words of four or more letters, without stopwords and plural s."""
+    return {
+        word.removesuffix("s")
+        for word in re.findall(r"[a-z][a-z0-9-]{3,}", text.lower())
+        if word not in DESCRIPTION_STOPWORDS
+    }
+
+
+def section_heuristics(
+    section: Section,
+    min_words: int = 150,
+    min_citations: int = 2,
+    min_term_coverage: float = 0.6,
+) -> dict:
+    """
+    Cheap local checks of a written section, the first tier of grading.
+
+    Counts the words of the section body (without titles and citations),
+    the distinct URLs it cites and the share of the key terms of its
+    description that the content covers. The section `passes` only when
+    every check meets its threshold.
+
+    Returns:
+        dict: `words`, `citations`, `term_coverage` and `passes`
+    """
+    words = sum(len(line.split()) for line in digest_lines(section))
+    citations = len(set(re.findall(r"https?://[^\s)\]>]+", section.content or "")))
+    terms = key_terms(section.description)
+    covered = terms & key_terms(section.content or "")
+    term_coverage = len(covered) / len(terms) if terms else 1.0
+    return {
+        "words": words,
+        "citations": citations,
+        "term_coverage": round(term_coverage, 3),
+        "passes": words >= min_words
+        and citations >= min_citations
+        and term_coverage >= min_term_coverage,
+    }
+
+
+def section_signature(section: Section) -> str:
+    """Identify a planned section by its normalized name and description."""
+    return (
+        " ".join(section.name.lower().split())
+        + "\n"
+        + " ".join(section.description.lower().split())
+    )
+
+
+def diff_report_plans(old_sections: list[Section], new_sections: list[Section]) -> dict:
+    """
+    Compare two report plans section by section.
+
+    Sections are matched on their normalized name and description; a change
+    of number or position alone does not count as a change.
+
+    Returns:
+        dict: Lists of `unchanged` and `changed` sections of the new plan and
+            `removed` sections of the old plan
+    """
+    old_signatures = {section_signature(section) for section in old_sections}
+    new_signatures = {section_signature(section) for section in new_sections}
+    return {
+        "unchanged": [
+            s for s in new_sections if section_signature(s) in old_signatures
+        ],
+        "changed": [
+            s for s in new_sections if section_signature(s) not in old_signatures
+        ],
+        "removed": [
+            s for s in old_sections if section_signature(s) not in new_signatures
+        ],
+    }
+
+
+class SectionEmitter:
+    """
+    Emits each section of the report as soon as it is finished, with its
+    position in the report, so the report can be shown progressively with
+    every section in its place. Sections are positioned as in the final
+    report: by `section_number`, and in the given order when numbers repeat.
+
+    Args:
+        section_numbers: Numbers of all sections of the report, in the order
+            their indexes are passed to `add`
+        emit: Callable receiving `report_section` events, e.g. a StreamWriter
+    """
+
+    def __init__(self, section_numbers, emit):
+        order = sorted(range(len(section_numbers)), key=lambda i: section_numbers[i])
+        self.positions = {index: position for position, index in enumerate(order)}
+        self.emit = emit
+
+    def add(self, index: int, section: Section):
+        """Emit the finished section given at `index`."""
+        self.emit(
+            {
+                "type": "report_section",
+                "position": self.positions[index],
+                "section_number": section.section_number,
+                "content": section.content,
+            }
+        )
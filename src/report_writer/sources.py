@@ -0,0 +1,301 @@
+import os
+import hashlib
+
+from src.report_writer.telemetry import logger
+from src.report_writer.utils import count_tokens_local, truncate_tokens
+
+
+def iter_source_chunks(
+    source,
+    max_tokens_per_source=None,
+    include_raw_content=False,
+    token_counter=count_tokens_local,
+):
+    """
+    Yields the formatted text of a single source chunk by chunk.
+
+    Args:
+        source: Search result dict with title, url, content and optionally
+            raw_content
+        max_tokens_per_source: int, limit on the raw_content of the source
+        include_raw_content: bool
+        token_counter: Function counting the tokens of a string, used to
+            cut the raw_content at `max_tokens_per_source`
+
+    Yields:
+        str: Consecutive chunks of the formatted source
+    """
+    yield (
+        f"Source {source['title']}:\n===\n"
+        f"URL: {source['url']}\n===\n"
+        f"Most relevant content from source: {source['content']}\n===\n"
+    )
+    if include_raw_content:
+        # Handle None raw_content
+        raw_content = source.get("raw_content", "")
+        if raw_content is None:
+            raw_content = ""
+            logger.warning("No raw_content found for source %s", source["url"])
+        kept = raw_content
+        if max_tokens_per_source:
+            kept = truncate_tokens(raw_content, max_tokens_per_source, token_counter)
+        truncated = len(kept) < len(raw_content)
+        yield f"Full source content limited to {max_tokens_per_source} tokens: "
+        yield kept
+        yield "... [truncated]\n\n" if truncated else "\n\n"
+    else:
+        yield "\n"
+
+
+def unique_sources(search_response):
+    """Deduplicate the results of a list of search responses by URL."""
+    return list(
+        {
+            source["url"]: source
+            for response in search_response
+            for source in response["results"]
+        }.values()
+    )
+
+
+# Whether checkpoints keep the full page content of sources, rather than
+# only the passages sections were written from
+CHECKPOINT_RAW_CONTENT = os.getenv("CHECKPOINT_RAW_CONTENT", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Separator of the passages kept from a page, as joined by `select_passages`
+PASSAGE_SEPARATOR = "\n...\n"
+
+
+class SourceStore:
+    """
+    Sources of one report, interned by URL.
+
+    A page returned for several queries or sections is kept once, and
+    sections refer to their sources by ID; the text of a prompt is only
+    formatted from the store when the prompt is built. IDs are derived from
+    the URL, so they stay valid across checkpoints and resumed runs.
+
+    Args:
+        sources: Sources by ID, e.g. saved by an earlier run of the report
+    """
+
+    def __init__(self, sources: dict = None):
+        self._sources = dict(sources or {})
+
+    @staticmethod
+    def source_id(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+    def __contains__(self, source_id: str) -> bool:
+        return source_id in self._sources
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def add(self, search_response) -> tuple[list[str], dict]:
+        """
+        Intern the results of a list of search responses.
+
+        A page seen before keeps its stored copy, completed with the full
+        page content and the highest score of the new copy.
+
+        Returns:
+            tuple: The IDs of the results in order, without repeats, and the
+            sources by ID that were not in the store before
+        """
+        ids = {}
+        added = {}
+        for response in search_response:
+            for source in response["results"]:
+                source_id = self.source_id(source["url"])
+                ids[source_id] = None
+                stored = self._sources.get(source_id)
+                if stored is None:
+                    self._sources[source_id] = added[source_id] = source
+                    continue
+                update = {}
+                if source.get("raw_content") and not stored.get("raw_content"):
+                    update["raw_content"] = source["raw_content"]
+                if (source.get("score") or 0) > (stored.get("score") or 0):
+                    update["score"] = source["score"]
+                if update:
+                    self._sources[source_id] = {**stored, **update}
+        return list(ids), {source_id: self._sources[source_id] for source_id in added}
+
+    def update(self, sources: dict):
+        """Add sources by ID, e.g. interned by a task replayed from a checkpoint."""
+        for source_id, source in sources.items():
+            self._sources.setdefault(source_id, source)
+
+    def get(self, source_ids: list[str]) -> list[dict]:
+        """Return the stored sources of the IDs, in order, skipping unknown IDs."""
+        return [
+            self._sources[source_id]
+            for source_id in source_ids
+            if source_id in self._sources
+        ]
+
+    def subset(self, source_ids) -> dict:
+        """Return the stored sources of the IDs by ID, e.g. to save them."""
+        return {
+            source_id: self._sources[source_id]
+            for source_id in source_ids
+            if source_id in self._sources
+        }
+
+    def for_checkpoint(self, source_ids, passages: dict = None) -> dict:
+        """
+        Return the stored sources of the IDs by ID, to save in a checkpoint.
+
+        Unless `CHECKPOINT_RAW_CONTENT` is set, the full page content is not
+        saved: a source keeps the passages selected from it instead, merged
+        across sections, or only its snippet when none were selected.
+
+        Args:
+            source_ids: IDs of the sources to save
+            passages: Lists of the passage texts selected from each source, by ID
+        """
+        sources = self.subset(source_ids)
+        if CHECKPOINT_RAW_CONTENT:
+            return sources
+        passages = passages or {}
+        saved = {}
+        for source_id, source in sources.items():
+            selected = dict.fromkeys(
+                passage
+                for text in passages.get(source_id, [])
+                for passage in text.split(PASSAGE_SEPARATOR)
+            )
+            saved[source_id] = {
+                **source,
+                "raw_content": PASSAGE_SEPARATOR.join(selected) or None,
+            }
+        return saved
+
+
+def iter_formatted_sources(
+    search_response,
+    max_tokens_per_source=None,
+    include_raw_content=False,
+    token_counter=count_tokens_local,
+):
+    """
+    Deduplicates the sources of a list of search responses by URL and yields
+    their formatted text chunk by chunk.
+
+    Shared by the Tavily and DuckDuckGo formatters. Joining the chunks gives
+    the full formatted string in linear time, and streaming them avoids
+    holding more than one source's text at a time.
+
+    Args:
+        search_response: List of search response dicts, see
+            `deduplicate_and_format_sources`
+        max_tokens_per_source: int, limit on the raw_content of each source
+        include_raw_content: bool
+        token_counter: Function counting the tokens of a string
+
+    Yields:
+        str: Consecutive chunks of the formatted sources
+    """
+    yield "Sources:\n\n"
+    for source in unique_sources(search_response):
+        yield from iter_source_chunks(
+            source,
+            max_tokens_per_source=max_tokens_per_source,
+            include_raw_content=include_raw_content,
+            token_counter=token_counter,
+        )
+
+
+def deduplicate_and_format_sources(
+    search_response,
+    max_tokens_per_source,
+    include_raw_content=True,
+    token_counter=count_tokens_local,
+):
+    """
+    Takes a list of search responses and formats them into a readable string.
+    Limits the raw_content to max_tokens_per_source tokens.
+
+    Args:
+        search_responses: List of search response dicts, each containing:
+            - query: str
+            - results: List of dicts with fields:
+                - title: str
+                - url: str
+                - content: str
+                - score: float
+                - raw_content: str|None
+        max_tokens_per_source: int
+        include_raw_content: bool
+        token_counter: Function counting the tokens of a string
+
+    Returns:
+        str: Formatted string with deduplicated sources
+    """
+    return "".join(
+        iter_formatted_sources(
+            search_response,
+            max_tokens_per_source=max_tokens_per_source,
+            include_raw_content=include_raw_content,
+            token_counter=token_counter,
+        )
+    ).strip()
+
+
+def pack_sources(
+    search_response,
+    budget_tokens,
+    token_counter=count_tokens_local,
+    max_tokens_per_source=None,
+    include_raw_content=False,
+    rank_by_score=True,
+):
+    """
+    Format the best deduplicated sources that fit within a token budget.
+
+    Sources are ranked by the provider relevance `score` (sources without a
+    score keep their original order after scored ones), or kept in the
+    provider's order without `rank_by_score`, and added greedily: a source
+    that does not fit is skipped and smaller ones are still tried.
+
+    Args:
+        search_response: List of search response dicts, see
+            `deduplicate_and_format_sources`
+        budget_tokens: int, token budget of the formatted sources
+        token_counter: Function returning the token count of a text
+        max_tokens_per_source: int, limit on the raw_content of each source
+        include_raw_content: bool
+        rank_by_score: bool, whether the provider returns relevance scores
+
+    Returns:
+        str: Formatted string with the selected sources
+    """
+    ranked_sources = unique_sources(search_response)
+    if rank_by_score:
+        ranked_sources = sorted(
+            ranked_sources, key=lambda source: -(source.get("score") or 0.0)
+        )
+
+    header = "Sources:\n\n"
+    remaining = budget_tokens - token_counter(header)
+    selected = []
+    for source in ranked_sources:
+        text = "".join(
+            iter_source_chunks(
+                source,
+                max_tokens_per_source=max_tokens_per_source,
+                include_raw_content=include_raw_content,
+                token_counter=token_counter,
+            )
+        )
+        tokens = token_counter(text)
+        if tokens <= remaining:
+            selected.append(text)
+            remaining -= tokens
+
+    return (header + "".join(selected)).strip()
@@ -1,16 +1,19 @@
-from typing import Literal
+import time
+import asyncio
+from typing import Literal, Optional
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain.chat_models import init_chat_model
 from langchain_core.runnables import RunnableConfig
 
 from langgraph.func import task, entrypoint
+from langgraph.config import get_stream_writer
 from langgraph.constants import Send
 from langgraph.types import interrupt, Command
 
 from src.report_writer.schemas_tasks import (
     ReportPlanInput,
     Queries,
+    SearchQuery,
     Section,
     Sections,
     SectionState,
@@ -18,35 +21,65 @@ from src.report_writer.schemas_tasks import (
     SectionWebSearchInput,
     WriteSectionInput,
     SectionGraderOutput,
+    FastSectionGraderOutput,
+    PlanGraderOutput,
     FinalSectionWriterInput,
     FinalReportInput,
 )
 from src.report_writer.configuration import Configuration
+from src.report_writer.llm import get_chat_model, ainvoke_model, build_prompt
+from src.report_writer.ranking import select_passages
+from src.report_writer.search import SearchBatcher, get_search_provider
+from src.report_writer.telemetry import logger, traced, span, record
 from src.report_writer.prompts import (
     report_planner_query_writer_instructions,
     report_planner_instructions,
+    report_plan_grader_instructions,
     section_query_writer_instructions,
     section_writer_instructions,
+    section_writer_inputs,
     section_grader_instructions,
+    section_grader_inputs,
     final_section_writer_instructions,
+    final_section_writer_context,
+    final_section_writer_inputs,
 )
-from src.report_writer.utils import (
-    tavily_search_async,
-    deduplicate_and_format_sources,
-    duckduckgo_search_async,
-    deduplicate_and_format_sources_duck,
-    format_sections,
-)
+from src.report_writer.cache import SearchCache
+from src.report_writer.sections import report_digest, section_heuristics
+from src.report_writer.sources import SourceStore, pack_sources
+from src.report_writer.utils import get_token_counter
 
 
-@task(name="generate_report_plan")
-async def generate_report_plan(state: ReportPlanInput, config: RunnableConfig):
-    """Generate the report plan"""
-    print(f"\n{'='*50}\n generate_report_plan \n{'='*50}\n")
+def get_writer():
+    """Stream writer of the running workflow, or a no-op outside of one."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda chunk: None
+
+
+def section_event(event_type: str, section: Section, **fields) -> dict:
+    """Build a typed stream event about a section.
+
+    Event types are `section_start` (a new draft begins, discard earlier
+    chunks), `section_chunk` (model tokens of the draft) and `section_done`
+    (the section content is final).
+    """
+    return {
+        "type": event_type,
+        "section_id": section.section_number,
+        "section_name": section.name,
+        **fields,
+    }
+
+
+@task(name="generate_planner_context")
+@traced("generate_planner_context")
+async def generate_planner_context(state: ReportPlanInput, config: RunnableConfig):
+    """Search the web for context to plan the report sections with"""
 
     # Inputs
     topic = state["topic"]
-    feedback = state.get("feedback_on_report_plan", None)
 
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
@@ -60,12 +93,12 @@ async def generate_report_plan(state: ReportPlanInput, config: RunnableConfig):
     # Set writer model (model used for query writing and section writing)
     query_writer_provider = configurable.query_writer_provider
     query_writer_model_name = configurable.query_writer_model
-    query_writer_model = init_chat_model(
+    query_writer_structured = get_chat_model(
+        provider=query_writer_provider,
         model=query_writer_model_name,
-        model_provider=query_writer_provider,
         temperature=0,
+        schema=Queries,
     )
-    query_writer_structured = query_writer_model.with_structured_output(Queries)
 
     # Format system instructions
     query_writer_system_instructions = report_planner_query_writer_instructions.format(
@@ -75,45 +108,55 @@ async def generate_report_plan(state: ReportPlanInput, config: RunnableConfig):
     )
 
     # Generate queries
-    queries_object = query_writer_structured.invoke(
+    queries_object = await ainvoke_model(
+        query_writer_structured,
         [SystemMessage(content=query_writer_system_instructions)]
         + [
             HumanMessage(
                 content="Generate search queries that will help with planning the sections of the report."
             )
-        ]
+        ],
+        cache=configurable.llm_cache_enabled("generate_planner_context"),
     )
 
     # Web search
     query_list = [query.search_query for query in queries_object.queries]
 
-    print("--------------------------------")
-    print(f"query object in generate_plan {queries_object}")
-    print("--------------------------------")
-    print(f"query list in generate_plan {query_list}")
+    logger.debug("generate_planner_context queries: %s", query_list)
 
-    # Get the search API
-    search_api = configurable.search_api
+    # Get the search provider
+    search_provider = get_search_provider(configurable.search_api)
 
     # Search the web
-    if search_api == "tavily":
-        web_search_results = await tavily_search_async(query_list)
-        web_search_results_formatted = deduplicate_and_format_sources(
-            web_search_results, max_tokens_per_source=600, include_raw_content=False
-        )
-    elif search_api == "duckduckgo":
-        web_search_results = await duckduckgo_search_async(query_list)
-        web_search_results_formatted = deduplicate_and_format_sources_duck(
-            web_search_results
-        )
-    else:
-        raise ValueError(f"Unsupported search API: {configurable.search_api}")
+    web_search_results = await search_provider.search(query_list)
+    web_search_results_formatted = search_provider.format_sources(web_search_results)
+
+    return {"planner_context": web_search_results_formatted}
+
+
+@task(name="generate_report_plan")
+@traced("generate_report_plan")
+async def generate_report_plan(state: ReportPlanInput, config: RunnableConfig):
+    """Generate the report plan from the planner context"""
+
+    # Inputs
+    topic = state["topic"]
+    feedback = state.get("feedback_on_report_plan", None)
+    planner_context = state["planner_context"]
+
+    # Get configuration
+    configurable = Configuration.from_runnable_config(config)
+    report_structure = configurable.report_structure
+
+    # Convert JSON object to string if necessary
+    if isinstance(report_structure, dict):
+        report_structure = str(report_structure)
 
     # Format system instructions
     system_instructions_sections = report_planner_instructions.format(
         topic=topic,
         report_structure=report_structure,
-        context=web_search_results_formatted,
+        context=planner_context,
         feedback=feedback,
     )
 
@@ -124,11 +167,13 @@ async def generate_report_plan(state: ReportPlanInput, config: RunnableConfig):
     planner_model = configurable.planner_model
 
     # Set the planner model
-    planner_llm = init_chat_model(model=planner_model, model_provider=planner_provider)
+    planner_structured_llm = get_chat_model(
+        provider=planner_provider, model=planner_model, schema=Sections
+    )
 
     # Generate sections
-    planner_structured_llm = planner_llm.with_structured_output(Sections)
-    report_sections = planner_structured_llm.invoke(
+    report_sections = await ainvoke_model(
+        planner_structured_llm,
         [SystemMessage(content=system_instructions_sections)]
         + [
             HumanMessage(
@@ -145,62 +190,107 @@ async def generate_report_plan(state: ReportPlanInput, config: RunnableConfig):
     return {"sections": sections}
 
 
-@task(name="human_feedback")
-async def human_feedback(state: Sections, config: RunnableConfig):
-    """Get feedback on the report plan"""
-    print(f"\n{'='*50}\n human_feedback \n{'='*50}\n")
-
-    # Get sections
-    sections = state
-    sections_str = "\n\n".join(
+def format_report_plan(sections: list[Section]) -> str:
+    """Format report plan sections for review."""
+    return "\n\n".join(
         f"{section.section_number} - Section: {section.name}\n"
         f"Description: {section.description}\n"
         f"Research needed: {'Yes' if section.research else 'No'}\n"
         for section in sections
     )
 
+
+def plan_feedback(feedback, sections: list[Section]) -> dict:
+    """
+    Route feedback on a report plan: `True` approves the plan and kicks off
+    section writing, a string regenerates the plan with it as feedback.
+    """
+    if isinstance(feedback, bool) and feedback is True:
+        generate_report_plan = False
+    elif isinstance(feedback, str):
+        generate_report_plan = True
+    else:
+        raise TypeError(f"Interrupt value of type {type(feedback)} is not supported.")
+
+    return {
+        "generate_report_plan": generate_report_plan,
+        "feedback_on_report_plan": feedback,
+        "sections_with_web_research": [
+            {"section": s, "search_iterations": 0} for s in sections if s.research
+        ],
+        "sections_without_web_research": [
+            {"section": s, "search_iterations": 0} for s in sections if not s.research
+        ],
+    }
+
+
+@traced("human_feedback")
+async def human_feedback(state: Sections):
+    """Get feedback on the report plan
+
+    Not a task: the interrupt belongs to the calling entrypoint, so each
+    resume answers one review and revisions interrupt again in turn.
+    """
+
+    # Get sections
+    sections = state
+    sections_str = format_report_plan(sections)
+
     # Get feedback on the report plan from interrupt
     feedback = interrupt(
         f"Please provide feedback on the following report plan. \n\n{sections_str}\n\n Does the report plan meet your needs? Pass 'true' to approve the report plan or provide feedback to regenerate the report plan:"
     )
 
-    # If the user approves the report plan, kick off section writing
-    if isinstance(feedback, bool) and feedback is True:
+    return plan_feedback(feedback, sections)
 
-        final_output = {}
-        final_output["generate_report_plan"] = False
-        final_output["feedback_on_report_plan"] = feedback
-        final_output["sections_with_web_research"] = [
-            {"section": s, "search_iterations": 0} for s in sections if s.research
-        ]
-        final_output["sections_without_web_research"] = [
-            {"section": s, "search_iterations": 0} for s in sections if not s.research
-        ]
-        return final_output
 
-    # If the user provides feedback, regenerate the report plan
-    elif isinstance(feedback, str):
+@task
+@traced("grade_report_plan")
+async def grade_report_plan(state: dict, config: RunnableConfig):
+    """Approve the report plan if the plan grader passes it, without an interrupt"""
 
-        final_output = {}
-        final_output["generate_report_plan"] = True
-        final_output["feedback_on_report_plan"] = feedback
-        final_output["sections_with_web_research"] = [
-            {"section": s, "search_iterations": 0} for s in sections if s.research
-        ]
-        final_output["sections_without_web_research"] = [
-            {"section": s, "search_iterations": 0} for s in sections if not s.research
-        ]
-        return final_output
-    else:
-        raise TypeError(f"Interrupt value of type {type(feedback)} is not supported.")
+    # Inputs
+    topic = state["topic"]
+    sections = state["sections"]
+
+    # Get configuration
+    configurable = Configuration.from_runnable_config(config)
+    report_structure = configurable.report_structure
+    if isinstance(report_structure, dict):
+        report_structure = str(report_structure)
+
+    system_instructions = report_plan_grader_instructions.format(
+        topic=topic,
+        report_structure=report_structure,
+        sections=format_report_plan(sections),
+    )
+
+    plan_grader = get_chat_model(
+        provider=configurable.plan_grader_provider,
+        model=configurable.plan_grader_model,
+        schema=PlanGraderOutput,
+    )
+    grade = await ainvoke_model(
+        plan_grader,
+        [SystemMessage(content=system_instructions)]
+        + [
+            HumanMessage(
+                content="Grade the report plan and give feedback on how to change it if it fails:"
+            )
+        ],
+    )
+
+    if grade.grade == "pass":
+        return plan_feedback(True, sections)
+    return plan_feedback(grade.feedback or "Revise the report plan.", sections)
 
 
 @task
+@traced("generate_section_queries")
 async def generate_section_queries(
     state: GenerateSectionQueriesInput, config: RunnableConfig
 ):
     """Generate search queries for a report section"""
-    print(f"\n{'='*50}\n generate_section_queries \n{'='*50}\n")
 
     # Get state
     section = state["section"]
@@ -213,12 +303,12 @@ async def generate_section_queries(
     # Generate queries
     query_writer_provider = configurable.query_writer_provider
     query_writer_model_name = configurable.query_writer_model
-    query_writer_model = init_chat_model(
+    query_writer_structured = get_chat_model(
+        provider=query_writer_provider,
         model=query_writer_model_name,
-        model_provider=query_writer_provider,
         temperature=0,
+        schema=Queries,
     )
-    query_writer_structured = query_writer_model.with_structured_output(Queries)
 
     # Format system instructions
     section_query_writer_system_instructions = section_query_writer_instructions.format(
@@ -226,9 +316,11 @@ async def generate_section_queries(
     )
 
     # Generate queries
-    queries = query_writer_structured.invoke(
+    queries = await ainvoke_model(
+        query_writer_structured,
         [SystemMessage(content=section_query_writer_system_instructions)]
-        + [HumanMessage(content="Generate search queries on the provided topic.")]
+        + [HumanMessage(content="Generate search queries on the provided topic.")],
+        cache=configurable.llm_cache_enabled("generate_section_queries"),
     )
     return {
         "section": section,
@@ -237,16 +329,22 @@ async def generate_section_queries(
     }
 
 
-async def search_web(state: SectionWebSearchInput, config: RunnableConfig):
-    """Search the web for each query, then return a list of raw sources and a formatted string of sources."""
-    print(f"\n{'='*50}\n search_web \n{'='*50}\n")
+@traced("search_web")
+async def search_web(
+    state: SectionWebSearchInput,
+    config: RunnableConfig,
+    batcher: Optional[SearchBatcher] = None,
+):
+    """Search the web for each query and return the search responses.
+
+    The responses are interned in the report's `SourceStore` by the caller;
+    they are only formatted when a prompt is built from them. When a `batcher` shared by the sections of a report is given, queries
+    already searched for another section are not sent to the provider again.
+    """
 
     # Get state
     search_queries = state["search_queries"]
     section = state["section"]
-    print("--------------------------------")
-    print("search_queries")
-    print(state)
 
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
@@ -254,203 +352,430 @@ async def search_web(state: SectionWebSearchInput, config: RunnableConfig):
     # Web search
     query_list = [query.search_query for query in search_queries]
 
-    # Get the search API
-    search_api = configurable.search_api
+    # Get the search provider
+    search_provider = get_search_provider(configurable.search_api)
 
-    print("--------------------------------")
-    print("query_list")
-    print(query_list)
+    logger.debug("search_web queries for %r: %s", section.name, query_list)
 
     # Search the web
-    if search_api == "tavily":
-        web_search_results = await tavily_search_async(query_list)
-        web_search_results_formatted = deduplicate_and_format_sources(
-            web_search_results, max_tokens_per_source=600, include_raw_content=False
-        )
-    elif search_api == "duckduckgo":
-        web_search_results = await duckduckgo_search_async(query_list)
-        web_search_results_formatted = deduplicate_and_format_sources_duck(
-            web_search_results
-        )
+    if batcher is not None:
+        web_search_results = await batcher.search(query_list, search_provider)
     else:
-        raise ValueError(f"Unsupported search API: {configurable.search_api}")
+        web_search_results = await search_provider.search(query_list)
 
     return {
         "section": section,
         "section_queries": search_queries,
-        "search_results": web_search_results_formatted,
+        "sources": web_search_results,
         "search_iterations": state["search_iterations"] + 1,
     }
 
 
+# Running mean latency of the section grader per model, to estimate the
+# latency saved when the cascade grades a section without it
+grader_latencies = {}
+
+
+async def grade_section_with_models(
+    section: Section, configurable: Configuration
+) -> tuple[SectionGraderOutput, str]:
+    """
+    Model tiers of the grading cascade: the fast grader model, when one is
+    configured, and the section grader when the fast grade is not confident.
+
+    Returns:
+        tuple: The feedback, and the tier that gave it (`fast_grader` or
+        `grader`)
+    """
+    cache = configurable.llm_cache_enabled("write_section")
+    section_grader_inputs_formatted = section_grader_inputs.format(
+        section_topic=section.description, section=section.content
+    )
+
+    fast_grader_model_name = configurable.fast_section_grader_model
+    if configurable.grading_cascade and fast_grader_model_name:
+        fast_grader_provider = configurable.fast_section_grader_provider
+        fast_grader = get_chat_model(
+            provider=fast_grader_provider,
+            model=fast_grader_model_name,
+            temperature=0,
+            schema=FastSectionGraderOutput,
+        )
+        fast_feedback = await ainvoke_model(
+            fast_grader,
+            build_prompt(
+                fast_grader_provider,
+                section_grader_instructions,
+                section_grader_inputs_formatted,
+            ),
+            cache=cache,
+        )
+        if fast_feedback.confidence >= float(configurable.fast_grader_min_confidence):
+            return (
+                SectionGraderOutput(
+                    grade=fast_feedback.grade,
+                    follow_up_queries=fast_feedback.follow_up_queries,
+                ),
+                "fast_grader",
+            )
+
+    section_grader_provider = configurable.section_grader_provider
+    section_grader_model_name = configurable.section_grader_model
+    section_grader_structured_llm = get_chat_model(
+        provider=section_grader_provider,
+        model=section_grader_model_name,
+        temperature=0,
+        schema=SectionGraderOutput,
+    )
+    start = time.perf_counter()
+    feedback = await ainvoke_model(
+        section_grader_structured_llm,
+        build_prompt(
+            section_grader_provider,
+            section_grader_instructions,
+            section_grader_inputs_formatted,
+        ),
+        cache=cache,
+    )
+    latency = time.perf_counter() - start
+    previous = grader_latencies.get(section_grader_model_name)
+    grader_latencies[section_grader_model_name] = (
+        latency if previous is None else previous + 0.2 * (latency - previous)
+    )
+    return feedback, "grader"
+
+
 @task(name="write_section")
-async def write_section(state: WriteSectionInput, config: RunnableConfig):
-    """Write a section of the report"""
-    print(f"\n{'='*50}\n write_section \n{'='*50}\n")
+@traced("write_section")
+async def write_section(
+    state: WriteSectionInput,
+    config: RunnableConfig,
+    source_store: Optional[SourceStore] = None,
+):
+    """Write a section of the report, refining it with follow-up searches until it passes grading or reaches the search depth
+
+    The section's sources are looked up by ID in the report's `source_store`.
+    Sources its follow-up searches add to the store are returned as
+    `interned_sources`, so a run resumed from this task's checkpoint can
+    restore them, and the passages the section was written from as
+    `source_passages`. Unless `CHECKPOINT_RAW_CONTENT` is set, interned
+    sources only keep those passages of their page content.
+    """
 
     # Get state
     section = state["section"]
-    source_str = state["source_str"]
-    search_queries = state.get("search_queris", "")
+    source_ids = list(state.get("source_ids") or [])
+    source_store = source_store if source_store is not None else SourceStore()
+    interned_sources = {}
+    source_passages = {}
+    source_str = ""
+    search_queries = list(state.get("search_queries") or [])
     search_iterations = state["search_iterations"]
 
     goto = None
 
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
+    max_search_depth = int(configurable.max_search_depth)
+    section_writer_model_name = configurable.section_writer_model
+    context_budget = configurable.context_budget(section_writer_model_name)
+    token_counter = get_token_counter(section_writer_model_name)
+    search_provider = get_search_provider(configurable.search_api)
+
+    searched_queries = {
+        SearchCache.normalize_query(query.search_query) for query in search_queries
+    }
+    iteration_metrics = []
+    writer = get_writer()
 
     while True:
+        with span(
+            "write_section_iteration", section=section.name, iteration=search_iterations
+        ) as iteration_span:
+            iteration_start = time.perf_counter()
+
+            # Keep the raw content passages most relevant to the section, when
+            # the provider returns page content, then pack the best sources
+            # into the writer's context budget
+            if source_ids:
+                ranked_sources = source_store.get(source_ids)
+                if search_provider.supports_raw_content:
+                    ranked_sources = select_passages(
+                        section.description,
+                        ranked_sources,
+                        top_k=int(configurable.passages_per_section),
+                    )
+                    source_passages = {
+                        SourceStore.source_id(source["url"]): [source["raw_content"]]
+                        for source in ranked_sources
+                        if source.get("raw_content")
+                    }
+                source_str = pack_sources(
+                    [{"results": ranked_sources}],
+                    budget_tokens=context_budget,
+                    token_counter=token_counter,
+                    max_tokens_per_source=600,
+                    include_raw_content=search_provider.supports_raw_content,
+                    rank_by_score=search_provider.supports_scores,
+                )
 
-        # Format system instructions
-        section_writer_system_instructions = section_writer_instructions.format(
-            section_title=section.name,
-            section_topic=section.description,
-            context=source_str,
-            section_content=section.content,
-        )
+            # Static instructions first, so providers cache them across
+            # sections; the section's own inputs go last
+            section_writer_provider = configurable.section_writer_provider
+            section_writer_messages = build_prompt(
+                section_writer_provider,
+                section_writer_instructions,
+                section_writer_inputs.format(
+                    section_topic=section.description,
+                    context=source_str,
+                    section_content=section.content,
+                ),
+            )
 
-        # Generate section
-        section_writer_provider = configurable.section_writer_provider
-        section_writer_model_name = configurable.section_writer_model
-        section_writer_model = init_chat_model(
-            model=section_writer_model_name,
-            model_provider=section_writer_provider,
-            temperature=0,
-        )
-        section_content = section_writer_model.invoke(
-            [SystemMessage(content=section_writer_system_instructions)]
-            + [
-                HumanMessage(
-                    content="Generate a report section based on the provided sources."
+            # Generate section
+            section_writer_model = get_chat_model(
+                provider=section_writer_provider,
+                model=section_writer_model_name,
+                temperature=0,
+            )
+            writer(section_event("section_start", section, iteration=search_iterations))
+            section_content = await ainvoke_model(
+                section_writer_model,
+                section_writer_messages,
+                on_chunk=lambda chunk: writer(
+                    section_event("section_chunk", section, chunk=chunk)
+                ),
+                cache=configurable.llm_cache_enabled("write_section"),
+            )
+
+            # Write content to the section object
+            section.content = section_content.content
+
+            # Cheap local checks first: a section that clearly passes them is
+            # not sent to a grader model at all
+            grade_start = time.perf_counter()
+            feedback, grade_tier = None, None
+            if configurable.grading_cascade:
+                checks = section_heuristics(section, **configurable.grading_heuristics)
+                if checks["passes"]:
+                    feedback = SectionGraderOutput(grade="pass", follow_up_queries=[])
+                    grade_tier = "heuristics"
+
+            # Speculatively search on the section topic while grading runs, so a
+            # failing grade does not wait for a whole search round trip
+            prefetch = None
+            speculative_query = SearchQuery(
+                search_query=f"{section.name}: {section.description}"
+            )
+            if (
+                feedback is None
+                and configurable.speculative_prefetch
+                and search_iterations < max_search_depth
+                and SearchCache.normalize_query(speculative_query.search_query)
+                not in searched_queries
+            ):
+                prefetch = asyncio.ensure_future(
+                    search_web(
+                        state={
+                            "section": section,
+                            "search_queries": [speculative_query],
+                            "search_iterations": search_iterations,
+                        },
+                        config=config,
+                    )
                 )
-            ]
-        )
 
-        # Write content to the section object
-        section.content = section_content.content
+            # Feedback from the model tiers when the heuristics are not conclusive
+            try:
+                if feedback is None:
+                    feedback, grade_tier = await grade_section_with_models(
+                        section, configurable
+                    )
+            except BaseException:
+                if prefetch is not None:
+                    prefetch.cancel()
+                raise
+            grade_latency = time.perf_counter() - grade_start
+            logger.debug(
+                "write_section grade for %r: %s (%s)",
+                section.name,
+                feedback.grade,
+                grade_tier,
+            )
 
-        # Grade prompt
-        section_grader_instructions_formatted = section_grader_instructions.format(
-            section_topic=section.description, section=section.content
-        )
-        print(f"\n{'-'*50}\n section_writer_grader_structured_llm \n{'-'*50}\n")
-
-        # Feedback
-        section_grader_provider = configurable.section_grader_provider
-        section_grader_model_name = configurable.section_grader_model
-        section_grader_llm = init_chat_model(
-            model=section_grader_model_name,
-            model_provider=section_grader_provider,
-            temperature=0,
-        )
-        section_grader_structured_llm = section_grader_llm.with_structured_output(
-            SectionGraderOutput
-        )
-        print("------------------------")
-        print("feedback")
-        feedback = section_grader_structured_llm.invoke(
-            [SystemMessage(content=section_grader_instructions_formatted)]
-            + [
-                HumanMessage(
-                    content="Grade the report and consider follow-up questions for missing information:"
+            # Latency saved against the section grader's running mean
+            latency_saved = 0.0
+            grader_latency = grader_latencies.get(configurable.section_grader_model)
+            if grade_tier != "grader" and grader_latency is not None:
+                latency_saved = max(0.0, grader_latency - grade_latency)
+            record("grades")
+            if grade_tier == "grader":
+                record("grade_escalations")
+            record("grade_latency_saved_ms", round(latency_saved * 1000, 3))
+
+            iteration_metrics.append(
+                {
+                    "iteration": search_iterations,
+                    "grade": feedback.grade,
+                    "grade_tier": grade_tier,
+                    "grade_ms": round(grade_latency * 1000, 3),
+                    "grade_latency_saved_ms": round(latency_saved * 1000, 3),
+                    "duration_ms": round(
+                        (time.perf_counter() - iteration_start) * 1000, 3
+                    ),
+                    **(iteration_span.counters if iteration_span else {}),
+                }
+            )
+
+        if feedback.grade == "pass" or search_iterations >= max_search_depth:
+            # An unneeded prefetch is left to finish into the search cache:
+            # its quota is spent, and a cancelled search is never cached
+            if prefetch is not None:
+                prefetch.add_done_callback(lambda f: f.cancelled() or f.exception())
+            goto = "end"
+            break
+
+        # Search the follow-up queries that were not searched already
+        follow_up_queries = [
+            query
+            for query in feedback.follow_up_queries
+            if SearchCache.normalize_query(query.search_query) not in searched_queries
+        ]
+        searches = []
+        if follow_up_queries:
+            searches.append(
+                search_web(
+                    state={
+                        "section": section,
+                        "search_queries": follow_up_queries,
+                        "search_iterations": search_iterations,
+                    },
+                    config=config,
                 )
-            ]
+            )
+        if prefetch is not None:
+            searches.append(prefetch)
+            follow_up_queries = follow_up_queries + [speculative_query]
+        results = await asyncio.gather(*searches)
+
+        # Merge the new results with the existing sources
+        known_ids = set(source_ids)
+        new_ids = []
+        for result in results:
+            ids, added = source_store.add(result["sources"])
+            interned_sources.update(added)
+            for source_id in ids:
+                if source_id not in known_ids:
+                    known_ids.add(source_id)
+                    new_ids.append(source_id)
+        source_ids.extend(new_ids)
+        search_queries.extend(follow_up_queries)
+        searched_queries.update(
+            SearchCache.normalize_query(query.search_query)
+            for query in follow_up_queries
         )
-        print("------------------------")
-        print("TESTING WEB SEARCH FOR WRITING")
-        print("------------------------")
-        feedback.grade == "fail"
-        if (
-            feedback.grade == "pass"
-            or state["search_iterations"] >= configurable.max_search_depth
-        ):
+        search_iterations += 1
+        iteration_metrics[-1]["new_sources"] = len(new_ids)
 
+        # Stop early once the grade has stabilized: without new sources a
+        # rewrite would get the same failing grade again
+        if not new_ids:
             goto = "end"
+            break
+        goto = "search_web"
+
+    writer(section_event("section_done", section))
+
+    escalations = sum(1 for m in iteration_metrics if m["grade_tier"] == "grader")
+    logger.info(
+        "write_section %r finished after %d iterations, %d grader escalations",
+        section.name,
+        len(iteration_metrics),
+        escalations,
+        extra={
+            "section": section.name,
+            "iterations": iteration_metrics,
+            "grade_escalation_rate": escalations / len(iteration_metrics),
+            "grade_latency_saved_ms": sum(
+                m["grade_latency_saved_ms"] for m in iteration_metrics
+            ),
+        },
+    )
 
-            return {
-                "section": section,
-                "search_results": source_str,
-                "search_iterations": search_iterations,
-                "search_queries": search_queries,
-                "goto": goto,
-            }
-        else:
-
-            result = await search_web(
-                state={
-                    "section": section,
-                    "search_queries": feedback.follow_up_queries,
-                    "search_iterations": state["search_iterations"],
-                },
-                config=config,
-            )
-            # result = future.result()
-            section = result["section"]
-            source_str = result["search_results"]
-            search_queries = result["section_queries"]
-            search_iterations = result["search_iterations"]
-            goto = "search_web"
-
-        return {
-            "section": section,
-            "search_results": source_str,
-            "search_iterations": search_iterations,
-            "search_queries": search_queries,
-            "goto": goto,
-        }
+    return {
+        "section": section,
+        "source_ids": source_ids,
+        "interned_sources": source_store.for_checkpoint(
+            interned_sources, source_passages
+        ),
+        "source_passages": source_passages,
+        "search_iterations": search_iterations,
+        "search_queries": search_queries,
+        "iterations": iteration_metrics,
+        "goto": goto,
+    }
+
+
+@task
+@traced("build_report_digest")
+async def build_report_digest(state: dict, config: RunnableConfig):
+    """Digest the completed research sections once for all final section writers"""
+
+    # Get configuration
+    configurable = Configuration.from_runnable_config(config)
+
+    sections = sorted(state["completed_sections"], key=lambda s: s.section_number)
+    digest = report_digest(
+        sections,
+        budget_tokens=int(configurable.report_digest_budget),
+        token_counter=get_token_counter(configurable.final_section_writer_model),
+    )
+    return {"report_digest": digest}
 
 
 @task(name="write_final_sections")
+@traced("write_final_sections")
 async def write_final_sections(state: FinalSectionWriterInput, config: RunnableConfig):
-    """Write final sections of the report, which do not require web search and use the completed sections as context"""
-    """Write a section of the report"""
-    print(f"\n{'='*50}\n write_final_sections \n{'='*50}\n")
-    print()
-    print(state)
-    print()
+    """Write final sections of the report, which do not require web search and use the digest of the completed sections as context"""
 
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
 
     # Get state
     section = state["section"]
-    # completed_report_sections = state["report_sections_from_research"]
-    completed_report_sections = format_sections(state["completed_sections"])
-
-    print("----------------------------------------------------------------")
-    print("completed_report_sections")
-    print(completed_report_sections)
-    print("----------------------------------------------------------------")
+    completed_report_sections = state["report_digest"]
 
-    # Format system instructions
-    final_section_writer_system_instructions = final_section_writer_instructions.format(
-        section_title=section.name,
-        section_topic=section.description,
-        context=completed_report_sections,
+    # The digest is the same for every final section of the report, so it
+    # follows the static instructions in the cached prefix
+    final_writer_provider = configurable.final_section_writer_provider
+    final_section_writer_messages = build_prompt(
+        final_writer_provider,
+        final_section_writer_instructions,
+        final_section_writer_inputs.format(section_topic=section.description),
+        shared=final_section_writer_context.format(context=completed_report_sections),
     )
 
     # Generate section
-    final_writer_provider = configurable.final_section_writer_provider
     final_writer_model_name = configurable.final_section_writer_model
-    final_writer_model = init_chat_model(
+    final_writer_model = get_chat_model(
+        provider=final_writer_provider,
         model=final_writer_model_name,
-        model_provider=final_writer_provider,
         temperature=0,
     )
-    section_content = final_writer_model.invoke(
-        [SystemMessage(content=final_section_writer_system_instructions)]
-        + [
-            HumanMessage(
-                content="Generate a report section based on the provided sources."
-            )
-        ]
+    writer = get_writer()
+    writer(section_event("section_start", section, iteration=0))
+    section_content = await ainvoke_model(
+        final_writer_model,
+        final_section_writer_messages,
+        on_chunk=lambda chunk: writer(
+            section_event("section_chunk", section, chunk=chunk)
+        ),
+        cache=configurable.llm_cache_enabled("write_final_sections"),
     )
-    print("----------------------------------------------------------------")
-    print("final sections")
-    print(section_content.content)
 
     # Write content to section
     section.content = section_content.content
+    writer(section_event("section_done", section))
 
     # Write the updated section to completed sections
     return {
@@ -466,9 +791,6 @@ def compile_final_report(state: FinalReportInput):
     sections_with_web_research = state["sections_with_web_research"]
 
     all_sections = sections_without_web_research + sections_with_web_research
-    print("--------------------------------------------------------")
-    print("all_sections")
-    print(all_sections)
 
     # Sort by 'value' key
     sorted_sections_list = sorted(
@@ -478,6 +800,6 @@ def compile_final_report(state: FinalReportInput):
     # Compile final report
     final_report = "\n\n".join([s["section"].content for s in sorted_sections_list])
 
-    print(f"{'='*50}\nFINAL REPORT\n{'='*50}\n\n{final_report}\n{'='*50}\n")
+    logger.debug("final report:\n%s", final_report)
 
     return {"final_report": final_report}
@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger("report_writer")
+
+# Fields of a LogRecord that are not user-supplied `extra` attributes
+RESERVED_RECORD_ATTRIBUTES = set(
+    vars(logging.LogRecord("", 0, "", 0, "", (), None))
+) | {"message", "asctime"}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format each record as one JSON object per line, including `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in RESERVED_RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    json_format: Optional[bool] = None,
+    path: Optional[str] = None,
+):
+    """
+    Configure the `report_writer` logger.
+
+    Defaults come from REPORT_WRITER_LOG_LEVEL (WARNING, so spans and debug
+    output are off), REPORT_WRITER_LOG_FORMAT (`text` or `json` for JSON
+    lines) and REPORT_WRITER_LOG_FILE (stderr when unset).
+    """
+    level = level or os.getenv("REPORT_WRITER_LOG_LEVEL", "WARNING")
+    if json_format is None:
+        json_format = os.getenv("REPORT_WRITER_LOG_FORMAT", "text") == "json"
+    path = path or os.getenv("REPORT_WRITER_LOG_FILE")
+
+    handler = logging.FileHandler(path) if path else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(
+        JsonLinesFormatter()
+        if json_format
+        else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+    logger.addHandler(handler)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
+configure_logging()
+
+
+class Span:
+    """Timing and counters of one unit of work, e.g. a task."""
+
+    __slots__ = ("name", "attributes", "counters", "start", "duration")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.counters = {}
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def add(self, key: str, value: float = 1):
+        self.counters[key] = self.counters.get(key, 0) + value
+
+
+current_span = contextvars.ContextVar("report_writer_span", default=None)
+
+
+def tracing_enabled() -> bool:
+    return logger.isEnabledFor(logging.INFO)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a unit of work and log its duration and counters when it ends.
+
+    Counters recorded with `record` inside the block (model calls, tokens,
+    search calls) are added to this span and to its parents. When INFO
+    logging is disabled the block runs without any bookkeeping.
+    """
+    if not tracing_enabled():
+        yield None
+        return
+
+    with collect(name, **attributes) as active:
+        yield active
+
+
+@contextmanager
+def collect(name: str, **attributes):
+    """
+    Like `span`, but counters are collected even when tracing is off, e.g.
+    to meter the token usage of a whole report. Yields the `Span`; it is
+    only logged when tracing is on.
+    """
+    active = Span(name, attributes)
+    token = current_span.set(active)
+    try:
+        yield active
+    finally:
+        current_span.reset(token)
+        active.duration = time.perf_counter() - active.start
+        parent = current_span.get()
+        if parent is not None:
+            for key, value in active.counters.items():
+                parent.add(key, value)
+        if tracing_enabled():
+            counters = dict(active.counters)
+            # Share of reported prompt tokens served from provider prompt caches
+            if counters.get("input_tokens"):
+                counters["cached_input_ratio"] = round(
+                    counters.get("cached_input_tokens", 0) / counters["input_tokens"], 3
+                )
+            logger.info(
+                "span %s finished in %.3fs",
+                name,
+                active.duration,
+                extra={
+                    "span": name,
+                    "duration_ms": round(active.duration * 1000, 3),
+                    **attributes,
+                    **counters,
+                },
+            )
+
+
+def record(key: str, value: float = 1):
+    """Add to a counter of the current span, if tracing is on."""
+    active = current_span.get()
+    if active is not None:
+        active.add(key, value)
+
+
+def traced(name: str):
+    """Run an async function inside a span of the given name."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,84 +1,205 @@
 import yaml
 import os
+import re
+import math
+import threading
+from types import MappingProxyType
+from functools import lru_cache
 
 import asyncio
-import requests
+import functools
 import time
 
-from tavily import TavilyClient, AsyncTavilyClient
-from duckduckgo_search import DDGS
-from langsmith import traceable
-
 from dotenv import load_dotenv, find_dotenv
 
-# Load the API keys from .env
-load_dotenv(find_dotenv(), override=True)
+# Load the API keys from .env, unless the environment is provided otherwise
+# (e.g. by the LangGraph server or a job runner) and the lookup is turned off
+if os.getenv("REPORT_WRITER_LOAD_DOTENV", "true").lower() not in ("0", "false", "no"):
+    load_dotenv(find_dotenv(), override=True)
+
+
+from src.report_writer.cache import SearchCache
+from src.report_writer.ratelimit import get_rate_limiter
+from src.report_writer.telemetry import logger
+
+# Search provider clients and modules are loaded on first use, so only the
+# configured provider is ever imported
+provider_clients = {}
+provider_clients_lock = threading.Lock()
+
+
+def get_tavily_client(asynchronous: bool = True):
+    """Get the process-wide Tavily client, creating it on first use."""
+    key = "tavily_async" if asynchronous else "tavily"
+    with provider_clients_lock:
+        client = provider_clients.get(key)
+        if client is None:
+            from tavily import TavilyClient, AsyncTavilyClient
+
+            client = AsyncTavilyClient() if asynchronous else TavilyClient()
+            provider_clients[key] = client
+        return client
+
+
+def traceable(fn):
+    """`langsmith.traceable` for async functions, applied on the first call
+    so that langsmith is imported only once a traced function runs."""
+    traced_fn = None
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        nonlocal traced_fn
+        if traced_fn is None:
+            from langsmith import traceable as langsmith_traceable
+
+            traced_fn = langsmith_traceable(fn)
+        return await traced_fn(*args, **kwargs)
+
+    return wrapper
+
 
+# Seconds between checks of the config file's modification time
+CONFIG_RELOAD_INTERVAL = float(os.getenv("CONFIG_RELOAD_INTERVAL", 1.0))
 
-from src.report_writer.schemas_tasks import Section
+config_files = {}
+config_files_lock = threading.Lock()
+# Returned when there is no config file, the same object on every call
+EMPTY_CONFIG = MappingProxyType({})
 
-tavily_client = TavilyClient()
-tavily_async_client = AsyncTavilyClient()
 
+def load_config(file_path=None) -> dict:
+    """
+    Load configuration from a YAML file, by default the one at CONFIG_FILEPATH.
+
+    The parsed file is cached and parsed again only when its modification
+    time changes, which is checked at most every CONFIG_RELOAD_INTERVAL
+    seconds, so edits are picked up without a restart. Without a file an
+    empty mapping is returned and the built-in defaults apply.
+    """
+    file_path = file_path or os.getenv("CONFIG_FILEPATH")
+    if not file_path:
+        return EMPTY_CONFIG
+
+    now = time.monotonic()
+    with config_files_lock:
+        cached = config_files.get(file_path)
+    if cached is not None and now - cached["checked_at"] < CONFIG_RELOAD_INTERVAL:
+        return cached["config"]
+
+    mtime = os.stat(file_path).st_mtime_ns
+    if cached is not None and cached["mtime"] == mtime:
+        cached["checked_at"] = now
+        return cached["config"]
 
-def load_config(file_path=os.getenv("CONFIG_FILEPATH")):
-    """Load configuration from a YAML file."""
     with open(file_path, "r") as file:
-        config = yaml.safe_load(file)
+        config = yaml.safe_load(file) or {}
+    with config_files_lock:
+        config_files[file_path] = {"checked_at": now, "mtime": mtime, "config": config}
     return config
 
 
-def deduplicate_and_format_sources(
-    search_response, max_tokens_per_source, include_raw_content=True
-):
-    """
-    Takes a list of search responses and formats them into a readable string.
-    Limits the raw_content to approximately max_tokens_per_source.
+search_cache = SearchCache(
+    path=os.getenv("SEARCH_CACHE_PATH", ".cache/search_cache.sqlite"),
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", 24 * 60 * 60)),
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 10_000)),
+)
 
-    Args:
-        search_responses: List of search response dicts, each containing:
-            - query: str
-            - results: List of dicts with fields:
-                - title: str
-                - url: str
-                - content: str
-                - score: float
-                - raw_content: str|None
-        max_tokens_per_source: int
-        include_raw_content: bool
 
-    Returns:
-        str: Formatted string with deduplicated sources
+# Rough split of text into BPE-like pieces for the local token counter
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens_local(text: str) -> int:
+    """Approximate a BPE token count without any tokenizer dependency."""
+    return sum(
+        math.ceil(len(piece) / 4) for piece in TOKEN_PIECE_PATTERN.findall(text)
+    )
+
+
+token_counters = {}
+
+# tiktoken encodings by name, built once; None when an encoding could not be
+# loaded (its BPE file is downloaded on first use, so this fails offline)
+tiktoken_encodings = {}
+tiktoken_encodings_lock = threading.Lock()
+
+
+def register_token_counter(model: str, counter):
+    """Register a function counting the tokens of a text for a model."""
+    token_counters[model] = counter
+
+
+def get_tiktoken_encoding(model: str = None):
     """
-    # Collect all results
-    sources_list = []
-    for response in search_response:
-        sources_list.extend(response["results"])
-
-    # Deduplicate by URL
-    unique_sources = {source["url"]: source for source in sources_list}
-
-    # Format output
-    formatted_text = "Sources:\n\n"
-    for i, source in enumerate(unique_sources.values(), 1):
-        formatted_text += f"Source {source['title']}:\n===\n"
-        formatted_text += f"URL: {source['url']}\n===\n"
-        formatted_text += (
-            f"Most relevant content from source: {source['content']}\n===\n"
-        )
-        if include_raw_content:
-            # Using rough estimate of 4 characters per token
-            char_limit = max_tokens_per_source * 4
-            # Handle None raw_content
-            raw_content = source.get("raw_content", "")
-            if raw_content is None:
-                raw_content = ""
-                print(f"Warning: No raw_content found for source {source['url']}")
-            if len(raw_content) > char_limit:
-                raw_content = raw_content[:char_limit] + "... [truncated]"
-            formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
+    Get the tiktoken encoding of a model, or None if it cannot be used.
 
-    return formatted_text.strip()
+    Models tiktoken does not know (e.g. Groq or Anthropic models) are given
+    the `cl100k_base` encoding, which only approximates their tokenizers.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except Exception:
+        name = "cl100k_base"
+    with tiktoken_encodings_lock:
+        if name not in tiktoken_encodings:
+            try:
+                tiktoken_encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                logger.warning(
+                    "Could not load the tiktoken encoding %s (%s), counting "
+                    "tokens with the local approximation", name, e
+                )
+                tiktoken_encodings[name] = None
+        return tiktoken_encodings[name]
+
+
+def get_token_counter(model: str = None):
+    """
+    Get the token counting function for a model.
+
+    Uses a counter registered with `register_token_counter`, then a tiktoken
+    encoding if tiktoken is installed and the encoding loads, and falls back
+    to the local approximation. Counts are exact only for models tiktoken
+    knows; for others they are approximate. Counts are memoized, so
+    formatting the same source again for another prompt does not tokenize it
+    twice.
+    """
+    counter = token_counters.get(model)
+    if counter is None:
+        encoding = get_tiktoken_encoding(model)
+        if encoding is None:
+            counter = count_tokens_local
+        else:
+            counter = lambda text: len(encoding.encode(text, disallowed_special=()))
+        counter = lru_cache(maxsize=8192)(counter)
+        token_counters[model] = counter
+    return counter
+
+
+@lru_cache(maxsize=256)
+def truncate_tokens(text: str, max_tokens: int, token_counter=count_tokens_local) -> str:
+    """Return the longest prefix of the text that counts at most `max_tokens` tokens."""
+    # Count the prefixes without filling the memo of a memoized counter
+    count = getattr(token_counter, "__wrapped__", token_counter)
+    if count(text) <= max_tokens:
+        return text
+    # Tokens rarely span more than a few characters, so the search can start
+    # from a window of the text instead of all of it
+    low, high = 0, len(text)
+    window = max_tokens * 8
+    if window < high and count(text[:window]) > max_tokens:
+        high = window
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
 
 
 @traceable
@@ -109,11 +230,19 @@ async def tavily_search_async(search_queries):
                 }
     """
 
+    limiter = get_rate_limiter("tavily")
+    search_params = {"max_results": 5, "include_raw_content": True, "topic": "general"}
+
     search_tasks = []
     for query in search_queries:
         search_tasks.append(
-            tavily_async_client.search(
-                query, max_results=5, include_raw_content=True, topic="general"
+            search_cache.get_or_fetch(
+                "tavily",
+                query,
+                lambda query=query: limiter.run(
+                    lambda: get_tavily_client().search(query, **search_params)
+                ),
+                **search_params,
             )
         )
 
@@ -123,45 +252,10 @@ async def tavily_search_async(search_queries):
     return search_docs
 
 
-def deduplicate_and_format_sources_duck(search_response):
-    """
-    Takes a list of search responses and formats them into a readable string.
-
-    Args:
-        search_responses: List of search response dicts, each containing:
-            - query: str
-            - results: List of dicts with fields:
-                - title: str
-                - url: str
-                - content: str
-
-    Returns:
-        str: Formatted string with deduplicated sources
-    """
-    # Collect all results
-    sources_list = []
-    for response in search_response:
-        sources_list.extend(response["results"])
-
-    # Deduplicate by URL
-    unique_sources = {source["url"]: source for source in sources_list}
-
-    # Format output
-    formatted_text = "Sources:\n\n"
-    for i, source in enumerate(unique_sources.values(), 1):
-        formatted_text += f"Source {source['title']}:\n===\n"
-        formatted_text += f"URL: {source['url']}\n===\n"
-        formatted_text += (
-            f"Most relevant content from source: {source['content']}\n===\n\n"
-        )
-
-    return formatted_text.strip()
-
-
 @traceable
 async def duckduckgo_search_async(search_queries):
     """
-    Performs concurrent web searches using the DuckDuckGo API while avoiding rate limits.
+    Performs concurrent web searches using the DuckDuckGo API under its adaptive rate limiter.
 
     Args:
         search_queries (List[str]): List of search queries to process
@@ -180,53 +274,37 @@ async def duckduckgo_search_async(search_queries):
                 ]
             }
     """
-    semaphore = asyncio.Semaphore(3)  # Limit concurrent requests
+    limiter = get_rate_limiter("duckduckgo")
     results = []
 
     async def fetch(query):
-        async with semaphore:
-            with DDGS() as ddgs:
-                try:
-                    search_result = await asyncio.to_thread(
-                        ddgs.text, query, max_results=5
-                    )
-                    await asyncio.sleep(1.5)  # Avoid rate limits
-                    return {
-                        "query": query,
-                        "results": [
-                            {
-                                "title": r["title"],
-                                "url": r["href"],
-                                "content": r["body"],
-                            }
-                            for r in search_result
-                        ],
-                    }
-                except Exception as e:
-                    print(f"Error fetching results for query '{query}': {e}")
-                    return {"query": query, "results": []}
+        return await search_cache.get_or_fetch(
+            "duckduckgo", query, lambda: fetch_uncached(query), max_results=5
+        )
+
+    async def search(query):
+        from duckduckgo_search import DDGS
+
+        with DDGS() as ddgs:
+            return await asyncio.to_thread(ddgs.text, query, max_results=5)
+
+    async def fetch_uncached(query):
+        try:
+            search_result = await limiter.run(lambda: search(query))
+        except Exception as e:
+            logger.warning("Error fetching results for query %r: %s", query, e)
+            return {"query": query, "results": []}
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": r["title"],
+                    "url": r["href"],
+                    "content": r["body"],
+                }
+                for r in search_result
+            ],
+        }
 
     results = await asyncio.gather(*(fetch(query) for query in search_queries))
     return results
-
-
-def format_sections(sections: list[Section]) -> str:
-    """Format a list of sections into a string"""
-    formatted_str = ""
-    for idx, section in enumerate(sections, 1):
-        formatted_str += f"""
-                        {'='*60}
-                        Section {idx}: {section.section_number}
-                        {'='*60}
-                        Section {idx}: {section.name}
-                        {'='*60}
-                        Description:
-                        {section.description}
-                        Requires Research: 
-                        {section.research}
-
-                        Content:
-                        {section.content if section.content else '[Not yet written]'}
-
-                        """
-    return formatted_str
@@ -1,32 +1,114 @@
 from langgraph.func import entrypoint
 from langchain_core.runnables import RunnableConfig
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.types import StreamWriter
 from typing import List
 import asyncio
 
 from src.report_writer.tasks import (
+    generate_planner_context,
     generate_report_plan,
     human_feedback,
+    grade_report_plan,
+    plan_feedback,
     generate_section_queries,
     search_web,
     write_section,
+    build_report_digest,
     write_final_sections,
     compile_final_report,
 )
 from src.report_writer.configuration import Configuration
+from src.report_writer.schemas_tasks import Section
+from src.report_writer.search import SearchBatcher
+from src.report_writer.sections import (
+    SectionEmitter,
+    section_signature,
+    diff_report_plans,
+)
+from src.report_writer.sources import SourceStore
+from src.report_writer.telemetry import logger, traced
+from src.report_writer.checkpointer import make_checkpointer, mark_thread_completed
 
-checkpointer = MemorySaver()
+checkpointer = make_checkpointer()
 
 
-@entrypoint(checkpointer=checkpointer)
-async def report_planner_workflow(
-    input: dict, config: RunnableConfig, writer: StreamWriter, *, previous: dict
+async def research_section(
+    section_state: dict,
+    batcher: SearchBatcher,
+    source_store: SourceStore,
+    config: RunnableConfig,
+    research: dict = None,
 ) -> dict:
-    """Research report planner workflow"""
-    print(f"\n{'='*50}\n report_planner_workflow \n{'='*50}\n")
+    """Generate queries for a section, search the web and write the section, each step starting as soon as the previous one is done
 
-    final_result = ""
+    Search results are interned in the report's `source_store` and the
+    section refers to them by ID. When `research` from an earlier run holds
+    the queries and source IDs of an unchanged section, the section is
+    written from them without searching again.
+    """
+    if research is not None:
+        source_ids = research.get("source_ids")
+        if source_ids is None:
+            # Research saved before the source store holds the search responses
+            source_ids, _ = source_store.add(research["sources"])
+        return await write_section_from_store(
+            state={
+                "section": section_state["section"],
+                "source_ids": source_ids,
+                "search_queries": research["search_queries"],
+                "search_iterations": research["search_iterations"],
+            },
+            source_store=source_store,
+            config=config,
+        )
+
+    queries = await generate_section_queries(
+        {
+            "section": section_state["section"],
+            "search_iterations": section_state["search_iterations"],
+        },
+        config=config,
+    )
+
+    web_results = await search_web(
+        {
+            "section": queries["section"],
+            "search_queries": queries["search_queries"],
+            "search_iterations": queries["search_iterations"],
+        },
+        config=config,
+        batcher=batcher,
+    )
+
+    source_ids, _ = source_store.add(web_results["sources"])
+    return await write_section_from_store(
+        state={
+            "section": web_results["section"],
+            "source_ids": source_ids,
+            "search_queries": web_results["section_queries"],
+            "search_iterations": web_results["search_iterations"],
+        },
+        source_store=source_store,
+        config=config,
+    )
+
+
+async def write_section_from_store(
+    state: dict, source_store: SourceStore, config: RunnableConfig
+) -> dict:
+    """Write a section, restoring the sources it interned when it is replayed from a checkpoint"""
+    result = await write_section(state=state, config=config, source_store=source_store)
+    source_store.update(result["interned_sources"])
+    return result
+
+
+async def plan_report(input: dict, config: RunnableConfig, writer: StreamWriter) -> dict:
+    """Plan the report sections, revising the plan until it is approved
+
+    The planning tasks run in the calling entrypoint, so when a plan review
+    resumes its run they are replayed from that entrypoint's checkpoint
+    instead of searching and planning again.
+    """
 
     # Inputs
     topic = input["topic"]
@@ -34,10 +116,21 @@ async def report_planner_workflow(
 
     configurable = Configuration.from_runnable_config(config=config)
 
+    # Search for planning context once per topic; plan revisions reuse it,
+    # including revisions of a report from an earlier run passed in the input
+    planner_context = input.get("planner_context")
+    current_sections = input.get("sections")
+    if planner_context is None:
+        planner_context = (
+            await generate_planner_context(state={"topic": topic}, config=config)
+        )["planner_context"]
+
+    plan_revisions = 0
     while True:
         report_plan_input = {
             "topic": topic,
             "feedback_on_report_plan": feedback_on_report_plan,
+            "planner_context": planner_context,
         }
         writer("generate_report_plan started...")
 
@@ -47,60 +140,65 @@ async def report_planner_workflow(
         )
         writer("generate_report_plan finished...")
 
-        feedback = await human_feedback(state=list_of_sections["sections"])
+        # Report which sections the revision changed
+        if current_sections is not None:
+            plan_diff = diff_report_plans(current_sections, list_of_sections["sections"])
+            writer(
+                f"report plan revised: {len(plan_diff['changed'])} sections changed, "
+                f"{len(plan_diff['unchanged'])} unchanged, "
+                f"{len(plan_diff['removed'])} removed..."
+            )
+        current_sections = list_of_sections["sections"]
 
-        if not feedback["generate_report_plan"]:
-            futures = [
-                generate_section_queries(
-                    {
-                        "section": section["section"],
-                        "search_iterations": section["search_iterations"],
-                    }
-                )
-                for section in feedback["sections_with_web_research"]
-            ]
-
-            results = await asyncio.gather(*futures)
-
-            print("--------------------------------")
-            print(f"section_queries:\n{results}")
-
-            futures = [
-                search_web(
-                    {
-                        "section": result["section"],
-                        "search_queries": result["search_queries"],
-                        "search_iterations": result["search_iterations"],
-                    },
-                    config=config,
+        # Unattended runs review the plan without an interrupt and resume
+        if configurable.plan_approval == "interactive":
+            feedback = await human_feedback(state=current_sections)
+        elif (
+            configurable.plan_approval == "grader"
+            and plan_revisions < int(configurable.max_plan_revisions)
+        ):
+            feedback = await grade_report_plan(
+                state={"topic": topic, "sections": current_sections}, config=config
+            )
+            plan_revisions += 1
+        else:
+            if configurable.plan_approval == "grader":
+                logger.warning(
+                    "report plan approved after %d failed grades", plan_revisions
                 )
-                for result in results
-            ]
-            web_results = await asyncio.gather(*futures)
-
-            print("--------------------------------")
-            print(f"len web results: {len(web_results)}")
-            print("--------------------------------")
-            print(f"web_results:\n{web_results}")
+            feedback = plan_feedback(True, current_sections)
 
-            sections_search_iterations = {
+        if not feedback["generate_report_plan"]:
+            # Section research starts in the writer workflow, one pipeline per section
+            return {
+                "topic": topic,
+                "planner_context": planner_context,
+                "sections": current_sections,
                 "sections_without_web_research": feedback[
                     "sections_without_web_research"
                 ],
-                "sections_with_web_research": web_results,
+                "sections_with_web_research": feedback["sections_with_web_research"],
             }
-            return sections_search_iterations
         else:
             feedback_on_report_plan = feedback["feedback_on_report_plan"]
             continue
 
 
 @entrypoint(checkpointer=checkpointer)
+@traced("report_planner_workflow")
+async def report_planner_workflow(
+    input: dict, config: RunnableConfig, writer: StreamWriter, *, previous: dict
+) -> dict:
+    """Research report planner workflow"""
+    return await plan_report(input, config=config, writer=writer)
+
+
+@entrypoint(checkpointer=checkpointer)
+@traced("report_writer_workflow")
 async def report_writer_workflow(
     input: dict, config: RunnableConfig, writer: StreamWriter, *, previous: dict
 ) -> dict:
     "Research report writer workflow"
-    print(f"\n{'='*50}\n report_writer_workflow \n{'='*50}\n")
 
     final_result = ""
 
@@ -110,50 +208,125 @@ async def report_writer_workflow(
 
     configurable = Configuration.from_runnable_config(config=config)
 
-    planner_output = await report_planner_workflow.ainvoke(
-        {"topic": topic, "feedback_on_report_plan": feedback_on_report_plan}
-    )
+    # A revision of an earlier report on this thread reuses its planning context
+    # and the research of the sections the revision leaves unchanged
+    previous = previous if previous and previous.get("topic") == topic else {}
+
+    approved_sections = input.get("approved_sections")
+    if approved_sections is not None:
+        # A plan approved up front, e.g. in a batch run, skips planning and review
+        sections = [Section.model_validate(section) for section in approved_sections]
+        planner_output = {
+            "topic": topic,
+            "planner_context": previous.get("planner_context"),
+            "sections": sections,
+            "sections_with_web_research": [
+                {"section": s, "search_iterations": 0} for s in sections if s.research
+            ],
+            "sections_without_web_research": [
+                {"section": s, "search_iterations": 0}
+                for s in sections
+                if not s.research
+            ],
+        }
+    else:
+        planner_output = await plan_report(
+            {
+                "topic": topic,
+                "feedback_on_report_plan": feedback_on_report_plan,
+                "planner_context": previous.get("planner_context"),
+                "sections": previous.get("sections"),
+            },
+            config=config,
+            writer=writer,
+        )
 
     sections_with_web_research = planner_output["sections_with_web_research"]
     sections_without_web_research = planner_output["sections_without_web_research"]
 
+    # Research and write every section in its own pipeline, so that a slow
+    # section does not hold back the others at each stage
+    batcher = SearchBatcher(
+        similarity_threshold=(
+            float(configurable.query_similarity_threshold)
+            if configurable.query_similarity_threshold is not None
+            else None
+        )
+    )
+    previous_research = previous.get("section_research", {})
+    # Every page is stored once per report; sections keep source IDs
+    source_store = SourceStore(previous.get("sources"))
+    # Stream each section as it finishes, placed at its position in the
+    # report; sections are indexed in the order the final report sorts them
+    report_sections = sections_without_web_research + sections_with_web_research
+    report_emitter = SectionEmitter(
+        [section["section"].section_number for section in report_sections],
+        writer,
+    )
+
+    async def emit_when_done(index, future):
+        result = await future
+        report_emitter.add(index, result["section"])
+        return result
+
     futures = [
-        write_section(
-            state={
-                "section": sections_with_web_research[i]["section"],
-                "source_str": sections_with_web_research[i]["search_results"],
-                "search_iterations": sections_with_web_research[i]["search_iterations"],
-            },
-            config=config,
+        emit_when_done(
+            len(sections_without_web_research) + index,
+            research_section(
+                section,
+                batcher=batcher,
+                source_store=source_store,
+                config=config,
+                research=previous_research.get(section_signature(section["section"])),
+            ),
         )
-        for i in range(len(sections_with_web_research))
+        for index, section in enumerate(sections_with_web_research)
     ]
+
+    # Only the final sections wait for all research sections
     completed_sections_with_web_research = await asyncio.gather(*futures)
 
-    print("--------------------------------")
-    print(f"section_grades:\n{completed_sections_with_web_research}")
+    search_stats = batcher.stats()
+    logger.info(
+        "section search: %d queries, %d unique, %d provider calls saved",
+        search_stats["requested"],
+        search_stats["unique"],
+        search_stats["saved"],
+        extra=search_stats,
+    )
+    writer(f"write_section finished, {search_stats['saved']} provider calls saved...")
+
+    logger.debug("completed sections: %s", completed_sections_with_web_research)
 
     all_completed_sections_with_web_research = [
         completed_section["section"]
         for completed_section in completed_sections_with_web_research
     ]
 
-    futures = [
-        write_final_sections(
-            state={
-                "section": section["section"],
-                "completed_sections": all_completed_sections_with_web_research,
-            },
+    # One compact digest of the research sections, shared by all final sections
+    digest = (
+        await build_report_digest(
+            state={"completed_sections": all_completed_sections_with_web_research},
             config=config,
         )
-        for section in sections_without_web_research
+    )["report_digest"]
+
+    futures = [
+        emit_when_done(
+            index,
+            write_final_sections(
+                state={
+                    "section": section["section"],
+                    "report_digest": digest,
+                },
+                config=config,
+            ),
+        )
+        for index, section in enumerate(sections_without_web_research)
     ]
     final_sections_without_web_research = await asyncio.gather(*futures)
 
-    print("--------------------------------")
-    print(
-        f"final_sections_without_web_research:\n{final_sections_without_web_research}"
-    )
+    logger.debug("final sections: %s", final_sections_without_web_research)
 
     final_report = compile_final_report(
         state={
@@ -162,4 +335,39 @@ async def report_writer_workflow(
         }
     )
 
-    return final_report
+    await mark_thread_completed(checkpointer, config)
+
+    # Keep each section's research for incremental revisions of the report
+    section_research = {
+        section_signature(completed_section["section"]): {
+            "source_ids": completed_section["source_ids"],
+            "search_queries": completed_section["search_queries"],
+            "search_iterations": completed_section["search_iterations"],
+        }
+        for completed_section in completed_sections_with_web_research
+    }
+    # The sources of all sections, each stored once with the passages the
+    # sections were written from
+    source_passages = {}
+    for completed_section in completed_sections_with_web_research:
+        for source_id, passages in completed_section.get("source_passages", {}).items():
+            source_passages.setdefault(source_id, []).extend(passages)
+    sources = source_store.for_checkpoint(
+        (
+            source_id
+            for research in section_research.values()
+            for source_id in research["source_ids"]
+        ),
+        source_passages,
+    )
+    return entrypoint.final(
+        value=final_report,
+        save={
+            "topic": topic,
+            "planner_context": planner_output["planner_context"],
+            "sections": planner_output["sections"],
+            "section_research": section_research,
+            "sources": sources,
+            **final_report,
+        },
+    )